@@ -16,6 +16,15 @@ class ACLCompressor:
         _fields_ = [("offset", ctypes.POINTER(ctypes.c_ubyte)),
                     ("size", ctypes.c_size_t)]
 
+    # Totals since the last reset_timings call, see native_timings in the DLL source
+    class NativeTimings(ctypes.Structure):
+        _fields_ = [("compress_calls", ctypes.c_uint64),
+                    ("compress_ns", ctypes.c_uint64),
+                    ("compress_acl_ns", ctypes.c_uint64),
+                    ("decompress_calls", ctypes.c_uint64),
+                    ("decompress_ns", ctypes.c_uint64),
+                    ("decompress_acl_ns", ctypes.c_uint64)]
+
     path = bpy.utils.user_resource('SCRIPTS', path='Addons\\FrontiersAnimationTools\\FrontiersAnimDecompress')
     name = "FrontiersAnimDecompress.dll"
 
@@ -24,29 +33,97 @@ class ACLCompressor:
         self.dll.decompress.restype = self.MemoryBuffer
         self.dll.compress.restype = self.MemoryBuffer
 
+        # Not available in DLLs built before windowed decompression
+        self.has_window = hasattr(self.dll, 'decompress_window')
+        if self.has_window:
+            self.dll.decompress_window.restype = self.MemoryBuffer
+            self.dll.decompress_window.argtypes = [ctypes.c_char_p, ctypes.c_uint32, ctypes.c_uint32]
+        self.has_free = hasattr(self.dll, 'free_buffer')
+        if self.has_free:
+            self.dll.free_buffer.restype = None
+            self.dll.free_buffer.argtypes = [ctypes.POINTER(ctypes.c_ubyte)]
+        # Not available in DLLs built before the timing hooks
+        self.has_timings = hasattr(self.dll, 'get_timings') and hasattr(self.dll, 'reset_timings')
+        if self.has_timings:
+            self.dll.get_timings.restype = None
+            self.dll.get_timings.argtypes = [ctypes.POINTER(self.NativeTimings)]
+            self.dll.reset_timings.restype = None
+            self.dll.reset_timings.argtypes = []
+
+    # Copy a returned buffer into Python memory and release the DLL's copy
+    def take_buffer(self, buffer_ptr):
+        if not buffer_ptr.size:
+            return io.BytesIO()
+        stream = ctypes.string_at(buffer_ptr.offset, buffer_ptr.size)
+        if self.has_free:
+            self.dll.free_buffer(buffer_ptr.offset)
+        return io.BytesIO(stream)
+
 
 def decompress(compressed_buffer):
     comp = ACLCompressor()
     if len(compressed_buffer):
-        decompressed_buffer_ptr = comp.dll.decompress(compressed_buffer)
-        if not decompressed_buffer_ptr.size:
-            return io.BytesIO()
-        decompressed_stream = bytes(decompressed_buffer_ptr.offset[:decompressed_buffer_ptr.size])
-        return io.BytesIO(decompressed_stream)
+        return comp.take_buffer(comp.dll.decompress(compressed_buffer))
     else:
         return io.BytesIO()
 
 
+# Without it, decompress_window decompresses the whole clip on every call
+def has_windowed_decompression():
+    return ACLCompressor().has_window
+
+
+# Decompress only frame_count frames starting at first_frame, see decompressed buffer struct below
+def decompress_window(compressed_buffer, first_frame, frame_count):
+    comp = ACLCompressor()
+    if not len(compressed_buffer):
+        return io.BytesIO()
+    if comp.has_window:
+        return comp.take_buffer(comp.dll.decompress_window(compressed_buffer, first_frame, frame_count))
+
+    # Older DLL, decompress everything and cut the window out of it
+    full_buffer = comp.take_buffer(comp.dll.decompress(compressed_buffer)).getbuffer()
+    if not len(full_buffer):
+        return io.BytesIO()
+    total_frames = int.from_bytes(full_buffer[0x8:0xC], byteorder='little')
+    track_count = int.from_bytes(full_buffer[0xC:0x10], byteorder='little')
+    first_frame = min(first_frame, total_frames)
+    frame_count = min(frame_count, total_frames - first_frame)
+    frame_size = 0x30 * track_count
+    window = io.BytesIO()
+    window.write(full_buffer[0x0:0x8])
+    window.write(frame_count.to_bytes(4, byteorder='little'))
+    window.write(full_buffer[0xC:0x10])
+    window.write(full_buffer[0x10 + first_frame * frame_size:0x10 + (first_frame + frame_count) * frame_size])
+    window.seek(0)
+    return window
+
+
+# Accepts bytes or any writable contiguous buffer (bytearray, NumPy array), the latter are passed without copying
 def compress(uncompressed_buffer):
     comp = ACLCompressor()
-    if len(uncompressed_buffer):
-        compressed_buffer_ptr = comp.dll.compress(uncompressed_buffer)
-        if not compressed_buffer_ptr.size:
-            return io.BytesIO()
-        compressed_stream = bytes(compressed_buffer_ptr.offset[:compressed_buffer_ptr.size])
-        return io.BytesIO(compressed_stream)
-    else:
+    if not len(uncompressed_buffer):
         return io.BytesIO()
+    if not isinstance(uncompressed_buffer, bytes):
+        view = memoryview(uncompressed_buffer).cast('B')
+        uncompressed_buffer = (ctypes.c_char * len(view)).from_buffer(view)
+    return comp.take_buffer(comp.dll.compress(uncompressed_buffer))
+
+
+# Time spent inside the DLL since the last reset, summed over every thread. None if the DLL has no timing hooks.
+def get_native_timings():
+    comp = ACLCompressor()
+    if not comp.has_timings:
+        return None
+    timings = ACLCompressor.NativeTimings()
+    comp.dll.get_timings(ctypes.byref(timings))
+    return {name: getattr(timings, name) for name, field_type in timings._fields_}
+
+
+def reset_native_timings():
+    comp = ACLCompressor()
+    if comp.has_timings:
+        comp.dll.reset_timings()
 
 
 """
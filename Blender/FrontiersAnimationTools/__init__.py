@@ -1,5 +1,5 @@
 import bpy
-from bpy.props import (BoolProperty, FloatProperty)
+from bpy.props import (BoolProperty, FloatProperty, StringProperty)
 
 from .animation.anim_import import FrontiersAnimImport
 from .animation.anim_export import FrontiersAnimExport
@@ -61,8 +61,7 @@ def register():
     )
     bpy.types.Action.pxd_compress = BoolProperty(
         name="Compress Animation",
-        description="Determines if animation gets compressed during batch export\n\n"
-        "(NOTE: Currently this setting is ignored and will always export compressed)",
+        description="Determines if animation gets compressed during batch export",
         default=True,
     )
     bpy.types.Action.pxd_additive = BoolProperty(
@@ -71,6 +70,29 @@ def register():
         default=False,
     )
 
+    # Register-only imports finish loading from these the first time the action is used
+    bpy.types.Action.pxd_source = StringProperty(
+        name="PXD Source File",
+        description="PXD animation file this action was imported from",
+        default="",
+        subtype='FILE_PATH',
+    )
+    bpy.types.Action.pxd_pending = BoolProperty(
+        name="PXD Import Pending",
+        description="Action is a placeholder and will be decoded from its source file when first used",
+        default=False,
+    )
+    bpy.types.Action.pxd_yx_skel = BoolProperty(
+        name="PXD YX Bone Orientation",
+        description="Action was imported onto a skeleton with YX bone orientation",
+        default=False,
+    )
+    bpy.types.Action.pxd_pad_loop = BoolProperty(
+        name="PXD Pad Loop",
+        description="Action was imported with loop padding",
+        default=False,
+    )
+
 
 def unregister():
     # Import/Export
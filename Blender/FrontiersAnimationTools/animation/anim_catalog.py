@@ -0,0 +1,177 @@
+"""
+SQLite catalog of the PXD animations under a folder, kept in the folder itself
+Only the headers of each file are read, so large game dumps can be searched without importing anything
+No bpy calls in here
+
+Scripts can query it directly, for example every additive clip with root motion longer than 120 frames:
+    AnimCatalog(folder).find(is_additive=True, has_root=True, min_frames=121)
+"""
+
+
+import os
+import sqlite3
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from .pxd_writer import NAXP_HEADER
+from ..bina import BINA_HEADER, DATA_OFFSET
+
+CATALOG_NAME = "frontiers_anim_catalog.db"
+# Bump whenever rows change for the same file, old catalogs are then rebuilt from scratch
+CATALOG_VERSION = 1
+ANIMATION_EXTENSION = ".anm.pxd"
+# Chunk size, hash, tag, version, padding, track type, track count, frame count, frame rate
+ACL_HEADER = struct.Struct('<IiIHBBIIf')
+HEADER_SIZE = DATA_OFFSET + NAXP_HEADER.size
+
+COLUMNS = ("path", "mtime", "size", "error",
+           "duration", "frame_count", "track_count", "frame_rate",
+           "is_additive", "is_compressed", "has_root",
+           "acl_version", "acl_track_type", "acl_track_count", "acl_frame_count", "acl_frame_rate",
+           )
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    path TEXT PRIMARY KEY,
+    mtime INTEGER,
+    size INTEGER,
+    error TEXT,
+    duration REAL,
+    frame_count INTEGER,
+    track_count INTEGER,
+    frame_rate REAL,
+    is_additive INTEGER,
+    is_compressed INTEGER,
+    has_root INTEGER,
+    acl_version INTEGER,
+    acl_track_type INTEGER,
+    acl_track_count INTEGER,
+    acl_frame_count INTEGER,
+    acl_frame_rate REAL
+);
+CREATE INDEX IF NOT EXISTS clips_frame_count ON clips (frame_count);
+CREATE INDEX IF NOT EXISTS clips_track_count ON clips (track_count);
+"""
+
+
+# Same fields as PXDAnimParam plus the ACL header of the main chunk, read from the start of the file only
+def scan_animation(filepath):
+    row = dict.fromkeys(COLUMNS)
+    try:
+        with open(filepath, "rb") as file:
+            data = file.read(HEADER_SIZE + ACL_HEADER.size)
+            if len(data) < HEADER_SIZE:
+                row["error"] = "Not a valid PXD animation file"
+                return row
+            (magic, version, flag_additive, flag_compressed, _, _,
+             duration, frame_count, track_count, _,
+             main_offset, root_offset, _) = NAXP_HEADER.unpack_from(data, DATA_OFFSET)
+            if magic != b'NAXP':
+                row["error"] = "Not a valid PXD animation file"
+                return row
+            if version != 512:
+                row["error"] = "Unsupported PXD version"
+                return row
+
+            # The main chunk directly follows the header in every file written so far
+            acl_header = None
+            if flag_compressed == 8 and main_offset:
+                if main_offset + DATA_OFFSET != HEADER_SIZE:
+                    file.seek(main_offset + DATA_OFFSET)
+                    data = data[:HEADER_SIZE] + file.read(ACL_HEADER.size)
+                if len(data) >= HEADER_SIZE + ACL_HEADER.size:
+                    acl_header = ACL_HEADER.unpack_from(data, HEADER_SIZE)
+    except OSError as error:
+        row["error"] = str(error)
+        return row
+
+    file_size = BINA_HEADER.unpack_from(data, 0x0)[1]
+    row["duration"] = duration
+    row["frame_count"] = frame_count
+    row["track_count"] = track_count
+    row["frame_rate"] = (frame_count - 1) / duration if duration != 0.0 else 30.0
+    row["is_additive"] = flag_additive == 1
+    row["is_compressed"] = flag_compressed == 8
+    # Animations compressed with old FrontiersAnimDecompress had non-existent root chunk offsets beyond EOF
+    row["has_root"] = bool(root_offset) and root_offset <= file_size - 2 * DATA_OFFSET
+    if acl_header:
+        (_, _, _, row["acl_version"], _, row["acl_track_type"],
+         row["acl_track_count"], row["acl_frame_count"], row["acl_frame_rate"]) = acl_header
+    return row
+
+
+class AnimCatalog:
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, CATALOG_NAME)
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != CATALOG_VERSION:
+            self.db.execute("DROP TABLE IF EXISTS clips")
+            self.db.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Rescan animations that are new or were modified since the last refresh, returns (rescanned, removed) counts
+    def refresh(self):
+        found = {}
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.lower().endswith(ANIMATION_EXTENSION):
+                    continue
+                filepath = os.path.join(root, name)
+                try:
+                    stat = os.stat(filepath)
+                except OSError:
+                    continue
+                found[os.path.relpath(filepath, self.directory)] = (stat.st_mtime_ns, stat.st_size)
+
+        known = {row["path"]: (row["mtime"], row["size"])
+                 for row in self.db.execute("SELECT path, mtime, size FROM clips")}
+        removed = [(file_name,) for file_name in known if file_name not in found]
+        stale = [file_name for file_name, stat in found.items() if known.get(file_name) != stat]
+
+        # A single small read per file, mostly waiting on the disk
+        rows = []
+        with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+            paths = [os.path.join(self.directory, file_name) for file_name in stale]
+            for file_name, row in zip(stale, executor.map(scan_animation, paths)):
+                row["path"] = file_name
+                row["mtime"], row["size"] = found[file_name]
+                rows.append(tuple(row[column] for column in COLUMNS))
+
+        with self.db:
+            self.db.executemany("DELETE FROM clips WHERE path = ?", removed)
+            self.db.executemany(f"INSERT OR REPLACE INTO clips ({', '.join(COLUMNS)}) "
+                                f"VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+        return len(stale), len(removed)
+
+    # Rows of readable clips matching every condition given, ordered by path
+    def find(self, is_additive=None, is_compressed=None, has_root=None, track_count=None, min_frames=None,
+             max_frames=None):
+        conditions = ["error IS NULL"]
+        params = []
+        for column, value in (("is_additive", is_additive),
+                              ("is_compressed", is_compressed),
+                              ("has_root", has_root),
+                              ("track_count", track_count)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(int(value))
+        if min_frames is not None:
+            conditions.append("frame_count >= ?")
+            params.append(min_frames)
+        if max_frames is not None:
+            conditions.append("frame_count <= ?")
+            params.append(max_frames)
+        return self.db.execute(f"SELECT * FROM clips WHERE {' AND '.join(conditions)} ORDER BY path",
+                               params).fetchall()
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM clips WHERE error IS NULL").fetchone()[0]
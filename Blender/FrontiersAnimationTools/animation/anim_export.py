@@ -1,185 +1,390 @@
 import bpy
-import mathutils
+import hashlib
 import math
-import struct
 import os
-import io
+import numpy as np
 from bpy_extras.io_utils import ExportHelper
 from bpy.props import (BoolProperty,
+                       FloatProperty,
                        StringProperty,
                        CollectionProperty
                        )
 from ..FrontiersAnimDecompress.process_buffer import compress
+from .transform_utils import pose_to_local, basis_to_local, quat_multiply
+from .anim_import import get_rig_binding, get_import_cache, load_pending_action, TRANSFORM_CHANNELS, INTERPOLATION_LINEAR
+from .pxd_writer import build_animation, build_uncompressed_animation, KEY_TOLERANCE
+from .console_output import PhaseTimer
+from ..profiling import profiled
+from ..bina import write_file
 
 RMS = 1 / math.sqrt(2)
-NULL = 0
+ADDON_PACKAGE = __package__.rpartition('.')[0]
+
+
+# Decompressed buffer struct (see process_buffer.py) as one contiguous array, tracks is a (frames, tracks, 12) view
+# into it so samples can be written in place and the whole buffer handed to the compressor without copies
+def new_track_buffer(frame_count, track_count, duration, frame_rate):
+    buffer = np.zeros(0x10 + frame_count * track_count * 0x30, dtype=np.uint8)
+    buffer[0x0:0x8].view('<f4')[:] = (duration, frame_rate)
+    buffer[0x8:0x10].view('<u4')[:] = (frame_count, track_count)
+    tracks = buffer[0x10:].view('<f4').reshape(frame_count, track_count, 12)
+    return buffer, tracks
+
+
+# Write Blender-space transforms into track columns, rot is wxyz. Works on a single frame or a block of frames.
+def set_track_columns(tracks, rot, loc, scale, length, bool_yx_skel):
+    if bool_yx_skel:
+        tracks[..., 0:4] = rot[..., (2, 3, 1, 0)]
+        tracks[..., 4:7] = loc[..., (1, 2, 0)]
+        tracks[..., 7] = length * scale[..., 1]
+        tracks[..., 8:11] = scale[..., (1, 2, 0)]
+    else:
+        tracks[..., 0:3] = rot[..., 1:4]
+        tracks[..., 3] = rot[..., 0]
+        tracks[..., 4:7] = loc
+        tracks[..., 7] = length * scale[..., 0]
+        tracks[..., 8:11] = scale
+    tracks[..., 11] = 1.0
+
+
+# Root motion columns from armature object transforms, root[frame] = location, rotation quaternion, scale
+def set_root_columns(tracks, root):
+    rot = quat_multiply(np.array((RMS, -RMS, 0.0, 0.0)), root[..., 3:7])
+    tracks[..., 0:3] = rot[..., 1:4]
+    tracks[..., 3] = rot[..., 0]
+    tracks[..., 4] = root[..., 0]
+    tracks[..., 5] = root[..., 2]
+    tracks[..., 6] = -root[..., 1]
+    tracks[..., 7] = 0.0
+    tracks[..., 8:11] = root[..., 7:10]
+    tracks[..., 11] = 1.0
+
+
+# Reason the action can't be sampled straight from its F-Curves, None if it can
+def get_fast_sample_blocker(arm_active, action_active, bool_root_motion):
+    anim_data = arm_active.animation_data
+    if not action_active or not anim_data or anim_data.action != action_active:
+        return "no active action"
+    if anim_data.drivers:
+        return "drivers"
+    if anim_data.use_tweak_mode or any(track.strips and not track.mute for track in anim_data.nla_tracks):
+        return "NLA tracks"
+    if anim_data.action_influence != 1.0 or anim_data.action_blend_type != 'REPLACE':
+        return "action blending"
+    if bool_root_motion and arm_active.rotation_mode != 'QUATERNION':
+        return "non-quaternion object rotation"
+    for pbone in arm_active.pose.bones:
+        if any(not constraint.mute for constraint in pbone.constraints):
+            return "bone constraints"
+        if pbone.rotation_mode != 'QUATERNION':
+            return "non-quaternion bone rotations"
+        bone = pbone.bone
+        if bone.use_connect or not bone.use_inherit_rotation or not bone.use_local_location or \
+                bone.inherit_scale != 'ALIGNED':
+            return "non-standard bone inheritance"
+    return None
+
+
+def has_simulation_zone(node_tree, visited):
+    if node_tree in visited:
+        return False
+    visited.add(node_tree)
+    for node in node_tree.nodes:
+        if node.bl_idname == 'GeometryNodeSimulationOutput':
+            return True
+        if node.type == 'GROUP' and node.node_tree and has_simulation_zone(node.node_tree, visited):
+            return True
+    return False
+
+
+# Reason the scene has to be stepped through from frame 0 for "Sample From Frame 0", None if every frame can be
+# evaluated on its own. Baked caches are read back as is and don't need a pre-roll.
+# Other add-ons can keep frame dependent state in depsgraph update handlers too, only this add-on's own are ignored.
+def get_preroll_requirement(scene):
+    rigidbody_world = scene.rigidbody_world
+    if rigidbody_world and rigidbody_world.enabled and not rigidbody_world.point_cache.is_baked:
+        return "rigid body simulation"
+    if bpy.app.handlers.frame_change_pre or bpy.app.handlers.frame_change_post:
+        return "frame change handlers"
+    for handler in bpy.app.handlers.depsgraph_update_post:
+        if not getattr(handler, "__module__", "").startswith(f"{ADDON_PACKAGE}."):
+            return "depsgraph update handlers"
+    for obj in scene.objects:
+        for modifier in obj.modifiers:
+            if modifier.type in {'CLOTH', 'SOFT_BODY'} and not modifier.point_cache.is_baked:
+                return f"{obj.name} simulation"
+            if modifier.type == 'PARTICLE_SYSTEM' and not modifier.particle_system.point_cache.is_baked:
+                return f"{obj.name} particles"
+            if modifier.type in {'DYNAMIC_PAINT', 'FLUID'}:
+                return f"{obj.name} simulation"
+            if modifier.type == 'NODES' and modifier.node_group and has_simulation_zone(modifier.node_group, set()):
+                return f"{obj.name} simulation nodes"
+    return None
+
+
+# Same values as fcurve.evaluate for every frame, plain linear curves are interpolated in one go
+def evaluate_fcurve(fcurve, frames):
+    points = fcurve.keyframe_points
+    if len(points) and not fcurve.modifiers and fcurve.extrapolation == 'CONSTANT':
+        interpolation = np.empty(len(points), dtype=np.int32)
+        points.foreach_get('interpolation', interpolation)
+        if np.all(interpolation[:-1] == INTERPOLATION_LINEAR):
+            co = np.empty(len(points) * 2, dtype=np.float32)
+            points.foreach_get('co', co)
+            return np.interp(frames, co[0::2], co[1::2])
+    return np.array([fcurve.evaluate(frame) for frame in frames])
+
+
+# Fill transforms[frame] = location, rotation quaternion, scale of target from the action,
+# channels without an F-Curve keep their current value like they would with frame_set
+def evaluate_transform_channels(action, data_path_prefix, target, frames, transforms):
+    column = 0
+    for data_path, channel_count in TRANSFORM_CHANNELS:
+        current = getattr(target, data_path)
+        for index in range(channel_count):
+            fcurve = action.fcurves.find(f"{data_path_prefix}{data_path}", index=index)
+            if fcurve and not fcurve.mute and not (fcurve.group and fcurve.group.mute):
+                transforms[:, column] = evaluate_fcurve(fcurve, frames)
+            else:
+                transforms[:, column] = current[index]
+            column += 1
 
 
-# Function used by batch export, keep outside of operator class
-def anim_export(self_pass, filepath, arm_active, action_active, start_frame, end_frame, frame_rate):
+# Evaluate the action numerically without updating the scene, only valid without get_fast_sample_blocker
+def sample_action(arm_active, action_active, start_frame, end_frame, bool_root_motion):
+    pose_bones = arm_active.pose.bones
+    frames = np.arange(start_frame, end_frame + 1, dtype=np.float64)
+
+    basis = np.empty((len(frames), len(pose_bones), 10))
+    for i, pbone in enumerate(pose_bones):
+        evaluate_transform_channels(action_active, f"{pbone.path_from_id()}.", pbone, frames, basis[:, i])
+
+    root = None
+    if bool_root_motion:
+        root = np.empty((len(frames), 10))
+        evaluate_transform_channels(action_active, "", arm_active, frames, root)
+
+    local_rot, local_loc, local_scale = basis_to_local(basis, get_rig_binding(arm_active))
+    return local_rot, local_loc, local_scale, root
+
+
+# Evaluate the scene frame by frame and read the resulting pose back
+def sample_scene(self_pass, arm_active, start_frame, end_frame, bool_root_motion):
+    frame_count = end_frame - start_frame + 1
+    pose_bones = arm_active.pose.bones
+    bone_count = len(pose_bones)
+    parents = np.array([pose_bones.find(pbone.parent.name) if pbone.parent else -1 for pbone in pose_bones],
+                       dtype=np.int32)
+
+    # Only copy the evaluated pose out per frame, the math is done for all frames at once afterwards
+    pose_matrices = np.empty((frame_count, bone_count, 16), dtype=np.float32)
+    pose_scales = np.empty((frame_count, bone_count, 3), dtype=np.float32)  # normal scale is different from matrix scale
+    root = np.empty((frame_count, 10)) if bool_root_motion else None
+
+    scene = bpy.context.scene
+    preroll_start = start_frame
+    if self_pass.bool_start_zero and get_preroll_requirement(scene):
+        preroll_start = min(0, start_frame)
+
+    for frame in range(preroll_start, end_frame + 1):
+        scene.frame_set(frame)
+        if frame < start_frame:
+            continue
+        frame_index = frame - start_frame
+
+        pose_bones.foreach_get('matrix', pose_matrices[frame_index].reshape(-1))
+        pose_bones.foreach_get('scale', pose_scales[frame_index].reshape(-1))
+
+        if bool_root_motion:
+            root[frame_index, 0:3] = arm_active.location
+            root[frame_index, 3:7] = arm_active.rotation_quaternion
+            root[frame_index, 7:10] = arm_active.scale
+
+    # Negate unscaled parent matrices, scales are written as is
+    # foreach_get flattens matrices column by column
+    matrices = pose_matrices.reshape(frame_count, bone_count, 4, 4).swapaxes(-1, -2)
+    local_rot, local_loc = pose_to_local(matrices, parents)
+    return local_rot, local_loc, pose_scales, root
+
+
+# Sampled raw buffers of one animation plus the header settings, everything needed to write the file
+class PXDExportData:
+    def __init__(self, name, duration, frame_count, bone_count, bool_root_motion, bool_additive, bool_compress,
+                 key_tolerance=KEY_TOLERANCE):
+        self.name = name
+        self.duration = duration
+        self.frame_count = frame_count
+        self.bone_count = bone_count
+        self.bool_root_motion = bool_root_motion
+        self.bool_additive = bool_additive
+        self.bool_compress = bool_compress
+        self.key_tolerance = key_tolerance  # Uncompressed only, see get_sparse_keys in pxd_writer.py
+        self.buffer_main = None  # Decompressed buffer struct, see process_buffer.py
+        self.buffer_root = bytes()
+        self.main_compressed = None
+        self.root_compressed = None
+        self.uncompressed_file = None  # Whole encoded file of uncompressed animations
+        self.timer = PhaseTimer()
+
+    # Identical hashes give byte-identical files
+    def get_hash(self):
+        digest = hashlib.sha256()
+        digest.update(bytes((self.bool_root_motion, self.bool_additive, self.bool_compress)))
+        if not self.bool_compress:
+            digest.update(np.float64(self.key_tolerance).tobytes())
+        digest.update(self.buffer_main)
+        digest.update(self.buffer_root)
+        return digest.hexdigest()
+
+    # Encoded once the sampled buffers are no longer needed
+    def is_encoded(self):
+        return self.main_compressed is not None or self.uncompressed_file is not None
+
+    # Take the encoded data of an identical animation instead of encoding again
+    def reuse_encoded(self, other):
+        self.main_compressed = other.main_compressed
+        self.root_compressed = other.root_compressed
+        self.uncompressed_file = other.uncompressed_file
+        self.drop_buffers()
+
+    # The sampled buffers are by far the largest part, batch export keeps export data around for deduplication
+    def drop_buffers(self):
+        self.buffer_main = None
+        self.buffer_root = bytes()
+
+
+# Everything that needs bpy, the result is handed to write_export_data.
+# samples skips sampling with the output of an earlier sample_scene pass covering the same frames.
+def sample_export_data(self_pass, arm_active, action_active, start_frame, end_frame, frame_rate, samples=None):
     frame_count = end_frame - start_frame + 1
     if frame_count > 1:
         duration = (frame_count - 1) / frame_rate
     else:
         duration = 0.0
-    bone_count = len(arm_active.pose.bones)
-
-    buffer_main = io.BytesIO()
-    buffer_root = io.BytesIO()
-
-    buffer_main.write(struct.pack('<f', duration))
-    buffer_main.write(struct.pack('<f', frame_rate))
-    buffer_main.write(struct.pack('<i', frame_count))
-    buffer_main.write(struct.pack('<i', bone_count))
+    pose_bones = arm_active.pose.bones
+    bone_count = len(pose_bones)
+    export_data = PXDExportData(action_active.name if action_active else arm_active.name, duration, frame_count,
+                                bone_count, self_pass.bool_root_motion, self_pass.bool_additive,
+                                self_pass.bool_compress, self_pass.float_key_tolerance)
 
+    export_data.buffer_main, tracks_main = new_track_buffer(frame_count, bone_count, duration, frame_rate)
     if self_pass.bool_root_motion:
-        buffer_root.write(struct.pack('<f', duration))
-        buffer_root.write(struct.pack('<f', frame_rate))
-        buffer_root.write(struct.pack('<i', frame_count))
-        buffer_root.write(struct.pack('<i', 1))
-
-    for frame in range(end_frame + 1):
-        if self_pass.bool_start_zero:
-            bpy.context.scene.frame_set(frame)
-            if frame < start_frame:
-                continue
-        elif frame >= start_frame:
-            bpy.context.scene.frame_set(frame)
-
-        # Build unscaled matrix map and separate scale map
-        matrix_map_temp = {}
-        scale_map_temp = {}
-        for pbone in arm_active.pose.bones:
-            tmp_loc, tmp_rot, tmp_scale = pbone.matrix.decompose()
-            tmp_matrix = mathutils.Matrix.LocRotScale(tmp_loc, tmp_rot, mathutils.Vector((1.0, 1.0, 1.0)))
-            matrix_map_temp.update({pbone.name: tmp_matrix})
-            scale_map_temp.update({pbone.name: pbone.scale.copy()})  # normal scale is different from matrix scale
-
-        # Negate unscaled parent matrices, write to buffer with actual scales
-        for pbone in arm_active.pose.bones:
-            if pbone.parent:
-                tmp_parent_matrix = matrix_map_temp[pbone.parent.name]
-                tmp_bone_length = pbone.length
-            else:
-                tmp_parent_matrix = mathutils.Matrix()
-                tmp_bone_length = 0.0
-            tmp_matrix = tmp_parent_matrix.inverted() @ matrix_map_temp[pbone.name]
-            tmp_loc, tmp_rot, tmp_scale = tmp_matrix.decompose()
-            tmp_scale = scale_map_temp[pbone.name]
-
-            if self_pass.bool_yx_skel:
-                if not pbone.parent:
-                    # Identity matrix to swap YX to XZ
-                    tmp_rot @= mathutils.Quaternion((0.5, 0.5, 0.5, 0.5))
-                buffer_main.write(struct.pack('<ffff', tmp_rot[2], tmp_rot[3], tmp_rot[1], tmp_rot[0]))
-                buffer_main.write(struct.pack('<fff', tmp_loc[1], tmp_loc[2], tmp_loc[0]))
-                buffer_main.write(struct.pack('<f', tmp_bone_length * tmp_scale[1]))
-                buffer_main.write(struct.pack('<fff', tmp_scale[1], tmp_scale[2], tmp_scale[0]))
-                buffer_main.write(struct.pack('<f', 1.0))
-            else:
-                buffer_main.write(struct.pack('<ffff', tmp_rot[1], tmp_rot[2], tmp_rot[3], tmp_rot[0]))
-                buffer_main.write(struct.pack('<fff', tmp_loc[0], tmp_loc[1], tmp_loc[2]))
-                buffer_main.write(struct.pack('<f', tmp_bone_length * tmp_scale[0]))
-                buffer_main.write(struct.pack('<fff', tmp_scale[0], tmp_scale[1], tmp_scale[2]))
-                buffer_main.write(struct.pack('<f', 1.0))
-
+        export_data.buffer_root, tracks_root = new_track_buffer(frame_count, 1, duration, frame_rate)
+
+    bool_fast_sample = self_pass.bool_fast_sample and samples is None
+    if bool_fast_sample:
+        blocker = get_fast_sample_blocker(arm_active, action_active, self_pass.bool_root_motion)
+        if blocker:
+            self_pass.report({'INFO'}, f"{export_data.name} has {blocker}, sampling through the scene instead.")
+            bool_fast_sample = False
+
+    timer = export_data.timer
+    if samples:
+        local_rot, local_loc, local_scale, root = samples
+    elif bool_fast_sample:
+        with timer.phase("sample"):
+            local_rot, local_loc, local_scale, root = sample_action(arm_active, action_active, start_frame,
+                                                                    end_frame, self_pass.bool_root_motion)
+    else:
+        with timer.phase("sample"):
+            local_rot, local_loc, local_scale, root = sample_scene(self_pass, arm_active, start_frame, end_frame,
+                                                                   self_pass.bool_root_motion)
+
+    with timer.phase("convert"):
+        # Bone lengths don't change while sampling
+        lengths = np.array([pbone.length if pbone.parent else 0.0 for pbone in pose_bones], dtype=np.float32)
+        if self_pass.bool_yx_skel:
+            # Identity matrix to swap YX to XZ
+            roots = np.array([i for i, pbone in enumerate(pose_bones) if not pbone.parent], dtype=np.int32)
+            local_rot[:, roots] = quat_multiply(local_rot[:, roots], np.array((0.5, 0.5, 0.5, 0.5)))
+        set_track_columns(tracks_main, local_rot, local_loc, local_scale, lengths, self_pass.bool_yx_skel)
         if self_pass.bool_root_motion:
-            tmp_loc = arm_active.location.copy()
-            tmp_rot = mathutils.Quaternion((RMS, -RMS, 0.0, 0.0)) @ arm_active.rotation_quaternion.copy()
-            tmp_scale = arm_active.scale.copy()
+            set_root_columns(tracks_root[:, 0], root)
+    return export_data
 
-            buffer_root.write(struct.pack('<ffff', tmp_rot[1], tmp_rot[2], tmp_rot[3], tmp_rot[0]))
-            buffer_root.write(struct.pack('<fff', tmp_loc[0], tmp_loc[2], -tmp_loc[1]))
-            buffer_root.write(struct.pack('<f', 0.0))
-            buffer_root.write(struct.pack('<fff', tmp_scale[0], tmp_scale[1], tmp_scale[2]))
-            buffer_root.write(struct.pack('<f', 1.0))
 
-    main_buffer_compressed = compress(buffer_main.getvalue())
+# Compress the sampled buffers, returns an error message or None on success
+def compress_export_data(export_data):
+    main_buffer_compressed = compress(export_data.buffer_main)
     if not len(main_buffer_compressed.getvalue()):
-        self_pass.report({'WARNING'}, f"{action_active.name} buffer failed to compress.")
-        return False
-
-    root_buffer_compressed = compress(buffer_root.getvalue())
-    if not len(root_buffer_compressed.getvalue()) and self_pass.bool_root_motion is True:
-        self_pass.report({'WARNING'}, f"{action_active.name} root buffer failed to compress.")
-        return False
-
-    del buffer_main
-    del buffer_root
+        export_data.drop_buffers()
+        return f"{export_data.name} buffer failed to compress."
+
+    root_buffer_compressed = compress(export_data.buffer_root)
+    export_data.drop_buffers()
+    if not len(root_buffer_compressed.getvalue()) and export_data.bool_root_motion is True:
+        return f"{export_data.name} root buffer failed to compress."
+
+    export_data.main_compressed = main_buffer_compressed
+    export_data.root_compressed = root_buffer_compressed
+    return None
+
+
+# Key tables of an uncompressed animation, built straight from the sampled buffers
+def build_uncompressed_export_data(export_data):
+    frame_count = export_data.frame_count
+    tracks_main = np.frombuffer(export_data.buffer_main, dtype='<f4', offset=0x10)
+    tracks_main = tracks_main.reshape(frame_count, export_data.bone_count, 12)
+    tracks_root = None
+    if export_data.bool_root_motion:
+        tracks_root = np.frombuffer(export_data.buffer_root, dtype='<f4', offset=0x10).reshape(frame_count, 1, 12)
+    return build_uncompressed_animation(tracks_main,
+                                        tracks_root,
+                                        export_data.duration,
+                                        export_data.bool_additive,
+                                        export_data.key_tolerance,
+                                        )
+
+
+# Compress or encode (unless already done) and write a sampled animation, returns an error message or None on success.
+# No bpy calls in here so batch export can run it on worker threads.
+def write_export_data(filepath, export_data):
+    duration = export_data.duration
+    frame_count = export_data.frame_count
+    bone_count = export_data.bone_count
+    timer = export_data.timer
+
+    if not export_data.bool_compress:
+        if export_data.uncompressed_file is None:
+            try:
+                with timer.phase("encode"):
+                    export_data.uncompressed_file = build_uncompressed_export_data(export_data)
+            except ValueError as error:
+                return f"{export_data.name}: {error}."
+            finally:
+                export_data.drop_buffers()
+        with timer.phase("write"):
+            write_file(filepath, export_data.uncompressed_file)
+        return None
+
+    if export_data.main_compressed is None:
+        with timer.phase("compress"):
+            error = compress_export_data(export_data)
+        if error:
+            return error
+    main_buffer_compressed = export_data.main_compressed
+    root_buffer_compressed = export_data.root_compressed
+
+    with timer.phase("write"):
+        data = build_animation(main_buffer_compressed.getvalue(),
+                               root_buffer_compressed.getvalue(),
+                               duration,
+                               frame_count,
+                               bone_count,
+                               export_data.bool_additive,
+                               export_data.bool_compress,
+                               )
+        write_file(filepath, data)
+    return None
 
-    with open(filepath, "wb") as file:
-        main_buffer_size = main_buffer_compressed.getbuffer().nbytes
-        root_buffer_size = root_buffer_compressed.getbuffer().nbytes
-
-        if self_pass.bool_root_motion and root_buffer_size:
-            main_chunk_size = main_buffer_size + 0x10 - main_buffer_size % 0x10
-            root_chunk_size = root_buffer_size + 4 - root_buffer_size % 4
-            file_size = 0x80 + main_chunk_size + root_chunk_size + 4
-        else:
-            file_size = 0x80 + main_buffer_size + 4 - main_buffer_size % 4 + 4
-
-        # BINA
-        bin_magic = bytes('BINA210L', 'ascii')
-        file.write(bin_magic)
-        file.write(struct.pack('<i', file_size))
-        file.write(struct.pack('<i', 1))
-
-        # DATA
-        data_magic = bytes('DATA', 'ascii')
-        file.write(data_magic)
-        file.write(struct.pack('<i', file_size - 0x10))
-        file.write(struct.pack('<i', file_size - 0x10 - 0x34))
-        file.write(struct.pack('<i', 0))
-
-        file.write(struct.pack('<i', 4))
-        file.write(struct.pack('<i', 0x18))
-        file.write(NULL.to_bytes(24, 'little'))
-
-        # PXAN
-        pxan_magic = bytes('NAXP', 'ascii')
-        file.write(pxan_magic)
-        file.write(struct.pack('<i', 0x200))
-        if self_pass.bool_additive:
-            file.write(struct.pack('<B', 1))
-        else:
-            file.write(struct.pack('<B', 0))
-
-        if self_pass.bool_compress:
-            file.write(struct.pack('<B', 8))
-        else:
-            file.write(struct.pack('<B', 0))
-
-        file.write(NULL.to_bytes(2, 'little'))
-        file.write(NULL.to_bytes(4, 'little'))
-
-        file.write(struct.pack('<i', 0x18))
-        file.write(struct.pack('<i', 0))
-        file.write(struct.pack('<f', duration))
-        file.write(struct.pack('<i', frame_count))
-
-        file.write(struct.pack('<i', bone_count))
-        file.write(struct.pack('<i', 0))
-        file.write(struct.pack('<q', 0x40))
-
-        # Root offset
-        if root_buffer_size:
-            file.write(struct.pack('<q', main_buffer_size + 0x40 + 0x10 - main_buffer_size % 0x10))
-        else:
-            file.write(struct.pack('<q', 0))
-        file.write(struct.pack('<q', 0))
-
-        # Compressed track
-        file.write(main_buffer_compressed.getvalue())
-        if root_buffer_size:
-            file.write(NULL.to_bytes(0x10 - main_buffer_size % 0x10, 'little'))
-            # Root track
-            file.write(root_buffer_compressed.getvalue())
-            file.write(NULL.to_bytes(4 - root_buffer_size % 4, 'little'))
-            file.write(struct.pack('<i', 0x00424644))
-        else:
-            file.write(NULL.to_bytes(4 - main_buffer_size % 4, 'little'))
-            file.write(struct.pack('<i', 0x00004644))
 
+# Function used by batch export, keep outside of operator class
+def anim_export(self_pass, filepath, arm_active, action_active, start_frame, end_frame, frame_rate):
+    export_data = sample_export_data(self_pass, arm_active, action_active, start_frame, end_frame, frame_rate)
+    error = write_export_data(filepath, export_data)
+    if error:
+        self_pass.report({'WARNING'}, error)
+        return False
     return True
 
 class FrontiersAnimExport(bpy.types.Operator, ExportHelper):
@@ -215,17 +420,42 @@ class FrontiersAnimExport(bpy.types.Operator, ExportHelper):
 
     bool_compress: BoolProperty(
         name="Compress Animation",
-        description="ACL compress animation to reduce file size\n\n"
-        "(NOTE: Uncompressed animation export currently unsupported)",
+        description="ACL compress animation to reduce file size. Uncompressed animations only store the keys "
+                    "needed to rebuild each bone's motion within the key tolerance",
         default=True,
     )
 
+    float_key_tolerance: FloatProperty(
+        name="Key Tolerance",
+        description="Keys of uncompressed animations are dropped wherever interpolating between their neighbours "
+                    "stays within this distance of the sampled value",
+        default=KEY_TOLERANCE,
+        min=0.0,
+        precision=5,
+    )
+
     bool_start_zero: BoolProperty(
         name="Sample From Frame 0",
         description="Enable to start sampling the animation from frame 0 regardless of the specified frame range. "
                     "Will not affect output frame range.\n\n"
                     "(NOTE: Will take longer if animation starts in middle of timeline, but useful for advanced users "
-                    "using features such as physics simulations)",
+                    "using features such as physics simulations. Skipped if nothing in the scene is simulated)",
+        default=False,
+    )
+
+    bool_fast_sample: BoolProperty(
+        name="Fast Sampling",
+        description="Read poses straight from the action's F-Curves instead of updating the whole scene every frame. "
+                    "Falls back to normal sampling if the armature has constraints, drivers or NLA tracks.\n\n"
+                    "(NOTE: \"Sample From Frame 0\" has no effect on fast sampled actions)",
+        default=True,
+    )
+
+    bool_profile: BoolProperty(
+        name="Profile",
+        description="Profile this export and write frontiers_export.prof to the output folder, together with "
+                    "frontiers_export_profile.txt summarizing the slowest functions and the time spent compressing "
+                    "and decompressing. Attach both to bug reports about slow exports",
         default=False,
     )
 
@@ -238,12 +468,15 @@ class FrontiersAnimExport(bpy.types.Operator, ExportHelper):
         ui_root_row.prop(self, "bool_root_motion", )
         ui_zero_row = ui_scene_box.row()
         ui_zero_row.prop(self, "bool_start_zero", )
+        ui_fast_row = ui_scene_box.row()
+        ui_fast_row.prop(self, "bool_fast_sample", )
         ui_additive_row = ui_scene_box.row()
         ui_additive_row.prop(self, "bool_additive", )
         ui_compress_row = ui_scene_box.row()
         ui_compress_row.prop(self, "bool_compress", )
-        # TODO: Implement uncompressed animation export
-        ui_compress_row.enabled = False
+        if not self.bool_compress:
+            ui_tolerance_row = ui_scene_box.row()
+            ui_tolerance_row.prop(self, "float_key_tolerance", )
 
         ui_bone_box = layout.box()
         ui_bone_box.label(text="Armature Settings", icon='ARMATURE_DATA')
@@ -251,6 +484,11 @@ class FrontiersAnimExport(bpy.types.Operator, ExportHelper):
         ui_orientation_row = ui_bone_box.row()
         ui_orientation_row.prop(self, "bool_yx_skel", )
 
+        ui_profile_box = layout.box()
+        ui_profile_box.label(text="Profiling Settings", icon='TIME')
+
+        ui_profile_box.row().prop(self, "bool_profile", )
+
     @classmethod
     def poll(cls, context):
         obj = context.active_object
@@ -259,6 +497,7 @@ class FrontiersAnimExport(bpy.types.Operator, ExportHelper):
         else:
             return False
 
+    @profiled("frontiers_export", lambda self: os.path.dirname(self.filepath))
     def execute(self, context):
         arm_active = context.active_object
         scene_active = context.scene
@@ -272,6 +511,17 @@ class FrontiersAnimExport(bpy.types.Operator, ExportHelper):
             bone.inherit_scale = 'ALIGNED'
 
         action_active = arm_active.animation_data.action
+        if self.bool_start_zero and not get_preroll_requirement(scene_active):
+            self.report({'INFO'}, "Nothing in the scene depends on previous frames, skipping the pre-roll from "
+                                  "frame 0.")
+        # Register-only actions have no keys until their source file is decoded
+        if action_active and action_active.pxd_pending:
+            cache = get_import_cache(scene_active)
+            loaded = load_pending_action(self, arm_active, action_active, cache)
+            if cache:
+                cache.evict()
+            if not loaded:
+                return {'CANCELLED'}
         frame_rate = scene_active.render.fps / scene_active.render.fps_base
 
         if not anim_export(self,
@@ -5,16 +5,34 @@ import struct
 import os
 import io
 import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from bpy_extras.io_utils import ImportHelper
 from bpy.props import (BoolProperty,
                        StringProperty,
                        EnumProperty,
+                       IntProperty,
                        CollectionProperty
                        )
-from ..FrontiersAnimDecompress.process_buffer import decompress
-from .console_output import BatchProgress
+from ..FrontiersAnimDecompress.process_buffer import decompress, decompress_window, has_windowed_decompression
+from .console_output import BatchProgress, PhaseTimer
+from ..profiling import profiled
+from .transform_utils import (RigBinding,
+                              tracks_to_local,
+                              local_to_basis,
+                              root_tracks_to_transforms,
+                              quat_match_hemisphere
+                              )
+from .import_cache import PoseCache
+from ..skeleton.skeleton_library import SkeletonLibrary
 
 RMS = 1 / math.sqrt(2)
+INTERPOLATION_LINEAR = 1  # Enum index of 'LINEAR' in Keyframe.interpolation
+TRANSFORM_CHANNELS = (("location", 3), ("rotation_quaternion", 4), ("scale", 3))
+# Responsive imports work in slices of this many seconds, started this often
+MODAL_SLICE = 0.05
+MODAL_INTERVAL = 0.01
 
 
 # Convert to global matrix with locations being unaffected by scale
@@ -98,6 +116,50 @@ def set_pose_matrices_global(obj, matrix_map_global, frame, keyframe_rules=None,
             rec(pbone, None)
 
 
+# Tile the clip three times over, same frames the old "frame % (frame_count - 1)" sampling produced
+def pad_loop_frames(frames):
+    loop = frames[:-1]
+    return np.concatenate((loop, loop, loop, frames[:1]))
+
+
+# Copy a window of frames starting at first_frame into keys, laid out like pad_loop_frames when loop_length is set
+def place_window_keys(keys, first_frame, values, loop_length=0):
+    if not loop_length:
+        keys[first_frame:first_frame + len(values)] = values
+        return
+    # The last frame of the clip is replaced by the first frame of the next loop
+    loop_values = values[:max(0, loop_length - first_frame)]
+    for loop_start in (0, loop_length, 2 * loop_length):
+        keys[loop_start + first_frame:loop_start + first_frame + len(loop_values)] = loop_values
+    if first_frame == 0:
+        keys[3 * loop_length] = values[0]
+
+
+# Create a channel's F-Curve with all of its keys at once instead of one keyframe_insert per frame
+def add_fcurve_keys(action, data_path, index, group, values):
+    key_count = len(values)
+    fcurve = action.fcurves.new(data_path, index=index, action_group=group)
+    fcurve.keyframe_points.add(key_count)
+
+    co = np.empty((key_count, 2), dtype=np.float32)
+    co[:, 0] = np.arange(key_count)
+    co[:, 1] = values
+    fcurve.keyframe_points.foreach_set('co', co.ravel())
+    fcurve.keyframe_points.foreach_set('interpolation', np.full(key_count, INTERPOLATION_LINEAR, dtype=np.int32))
+    fcurve.update()
+    return fcurve
+
+
+# Key location, rotation_quaternion and scale from a (frames, 10) transform array
+def add_transform_fcurves(action, data_path_prefix, group, transforms):
+    for index in range(3):
+        add_fcurve_keys(action, f"{data_path_prefix}location", index, group, transforms[:, index])
+    for index in range(4):
+        add_fcurve_keys(action, f"{data_path_prefix}rotation_quaternion", index, group, transforms[:, 3 + index])
+    for index in range(3):
+        add_fcurve_keys(action, f"{data_path_prefix}scale", index, group, transforms[:, 7 + index])
+
+
 # Parse keyframes into nested list for uncompressed animations
 def get_uncompressed_frame_table(anim_file, frame_count, track_count, table_offset):
     # track_table[frame index][track index][loc/rot/scale]
@@ -202,6 +264,283 @@ class PXDAnimParam:
         self.error = None
 
 
+def get_anim_name(file_name):
+    anim_name = file_name
+    for ext in [".outanim", ".anm", ".pxd"]:
+        anim_name = anim_name.replace(ext, "")
+    return anim_name
+
+
+# Rest data of the armature for track conversion, must be gathered on the main thread
+def get_rig_binding(arm_active):
+    pose_bones = arm_active.pose.bones
+    names = [pbone.name for pbone in pose_bones]
+    parents = [pose_bones.find(pbone.parent.name) if pbone.parent else -1 for pbone in pose_bones]
+    rest_matrices = [pbone.bone.matrix_local for pbone in pose_bones]
+    return RigBinding(names, parents, rest_matrices)
+
+
+# Index of the skeleton library folder set in the side panel, None if there isn't one
+def get_skeleton_library(scene):
+    directory = bpy.path.abspath(scene.frontiers_skeleton_library)
+    if not scene.frontiers_skeleton_library or not os.path.isdir(directory):
+        return None
+    return SkeletonLibrary(directory)
+
+
+def read_compressed_chunk(anim_file, offset):
+    anim_file.seek(offset)
+    buffer_length = int.from_bytes(anim_file.read(4), byteorder='little')
+    anim_file.seek(offset)
+    return anim_file.read(buffer_length)
+
+
+# View a decompressed buffer as a (frames, tracks, 12) float array
+def get_decompressed_tracks(buffer, frame_count, track_count):
+    sample_count = frame_count * track_count * 12
+    if len(buffer.getbuffer()) < 0x10 + sample_count * 4:
+        return None
+    tracks = np.frombuffer(buffer.getbuffer(), dtype='<f4', count=sample_count, offset=0x10)
+    return tracks.reshape(frame_count, track_count, 12)
+
+
+# Read an ACL chunk and decompress it to a (frames, tracks, 12) float array
+def read_compressed_tracks(anim_file, offset, frame_count, track_count):
+    buffer = decompress(read_compressed_chunk(anim_file, offset))
+    return get_decompressed_tracks(buffer, frame_count, track_count)
+
+
+# Decoded and converted animation, ready for F-Curve creation on the main thread
+class PXDAnimData:
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.name = get_anim_name(os.path.basename(filepath))
+        self.param = None
+        self.pad_loop = False
+        self.basis = None  # basis[frame][bone] = location (3), rotation quaternion wxyz (4), scale (3)
+        self.root = None  # root[frame] = armature object location, rotation quaternion, scale
+        self.stream = False  # Too long to convert at once, keyed window by window on the main thread
+        self.warnings = []
+        self.error = None
+        self.timer = PhaseTimer()
+
+
+# Everything up to keyframing, no bpy access so it can run on worker threads
+def load_animation(filepath, binding, bool_yx_skel, bool_root_motion, enum_loop_check, cache=None, header_only=False,
+                   stream_window=0):
+    anim_data = PXDAnimData(filepath)
+    timer = anim_data.timer
+    with timer.phase("read"), open(filepath, "rb") as anim_file:
+        if header_only:
+            file_bytes = anim_file.read(0x80)
+        else:
+            file_bytes = anim_file.read()
+    anim_file = io.BytesIO(file_bytes)
+
+    anim_param = PXDAnimParam(anim_file)
+    anim_param.name = anim_data.name
+    anim_data.param = anim_param
+    if anim_param.error:
+        anim_data.error = anim_param.error
+        return anim_data
+
+    # A single frame has nothing to loop
+    anim_data.pad_loop = anim_param.is_compressed and anim_param.frame_count > 1 and (
+        enum_loop_check == "loop_yes" or (enum_loop_check == "loop_auto" and "_loop" in anim_data.name))
+
+    # Uncompressed animations are keyed sparsely through the pose bones on the main thread
+    if header_only or not anim_param.is_compressed:
+        return anim_data
+
+    # Long clips are decoded later through iter_animation_windows, never as a whole.
+    # Older DLLs would decompress the whole clip for every window, those decode it once instead.
+    if stream_window and anim_param.frame_count > stream_window and has_windowed_decompression():
+        anim_data.stream = True
+        return anim_data
+
+    cached = None
+    if cache:
+        with timer.phase("cache"):
+            cache_key = cache.make_key(file_bytes, binding.hash, bool_yx_skel, bool_root_motion)
+            cached = cache.load(cache_key)
+
+    if cached:
+        anim_data.basis, anim_data.root = cached
+    else:
+        with timer.phase("decompress"):
+            main_tracks = read_compressed_tracks(anim_file, anim_param.main_offset,
+                                                 anim_param.frame_count, anim_param.track_count)
+            if main_tracks is None:
+                anim_data.error = f"{anim_data.name} buffer failed to initialize. File skipped."
+                return anim_data
+
+            root_tracks = None
+            if bool_root_motion and (anim_param.root_offset is not None):
+                root_tracks = read_compressed_tracks(anim_file, anim_param.root_offset, anim_param.frame_count, 1)
+                if root_tracks is None:
+                    anim_data.warnings.append(f"{anim_data.name} root buffer failed to initialize. Importing without root motion.")
+
+        with timer.phase("convert"):
+            rot, loc, scale = tracks_to_local(main_tracks, binding, bool_yx_skel)
+            anim_data.basis = local_to_basis(rot, loc, scale, binding)
+            if root_tracks is not None:
+                anim_data.root = root_tracks_to_transforms(root_tracks)
+
+        if cache:
+            with timer.phase("cache"):
+                cache.store(cache_key, anim_data.basis, anim_data.root)
+
+    # Loop padding reuses the converted frames
+    if anim_data.pad_loop:
+        with timer.phase("convert"):
+            anim_data.basis = pad_loop_frames(anim_data.basis)
+            if anim_data.root is not None:
+                anim_data.root = pad_loop_frames(anim_data.root)
+    return anim_data
+
+
+# Decode and convert a streamed animation window_size frames at a time, yields (first frame, basis, root).
+# Only one window of decompressed and converted frames is alive at once.
+def iter_animation_windows(anim_data, binding, bool_yx_skel, bool_root_motion, window_size):
+    anim_param = anim_data.param
+    timer = anim_data.timer
+    with open(anim_data.filepath, "rb") as anim_file:
+        with timer.phase("read"):
+            main_chunk = read_compressed_chunk(anim_file, anim_param.main_offset)
+
+        # Root motion is a single track, small enough to decode in one go
+        root = None
+        if bool_root_motion and (anim_param.root_offset is not None):
+            with timer.phase("decompress"):
+                root_tracks = read_compressed_tracks(anim_file, anim_param.root_offset, anim_param.frame_count, 1)
+            if root_tracks is None:
+                anim_data.warnings.append(f"{anim_data.name} root buffer failed to initialize. Importing without root motion.")
+            else:
+                root = root_tracks_to_transforms(root_tracks)
+
+    last_rot = None
+    for first_frame in range(0, anim_param.frame_count, window_size):
+        frame_count = min(window_size, anim_param.frame_count - first_frame)
+        with timer.phase("decompress"):
+            buffer = decompress_window(main_chunk, first_frame, frame_count)
+            main_tracks = get_decompressed_tracks(buffer, frame_count, anim_param.track_count)
+        if main_tracks is None:
+            raise ValueError(f"{anim_data.name} buffer failed to initialize. File skipped.")
+
+        with timer.phase("convert"):
+            rot, loc, scale = tracks_to_local(main_tracks, binding, bool_yx_skel)
+            basis = local_to_basis(rot, loc, scale, binding)
+            del main_tracks, buffer, rot, loc, scale
+            if last_rot is not None:
+                basis[..., 3:7] = quat_match_hemisphere(basis[..., 3:7], last_rot)
+            last_rot = basis[-1, :, 3:7].copy()
+
+        yield first_frame, basis, None if root is None else root[first_frame:first_frame + frame_count]
+
+
+# Key a streamed animation window by window.
+# foreach_set can only write whole keyframe collections, so each window's keys are copied into a float32 buffer and
+# every F-Curve is written once at the end. The buffer is small next to the keyframes Blender stores for the action,
+# only the decoded and converted frames are the ones kept to a window at a time.
+# Yields after every window and bone so responsive imports can pause in between, returns whether root motion was keyed.
+def write_anim_windows(arm_active, action, anim_data, windows, progress=None):
+    anim_param = anim_data.param
+    pose_bones = arm_active.pose.bones
+    loop_length = anim_param.frame_count - 1 if anim_data.pad_loop else 0
+    key_count = 3 * loop_length + 1 if loop_length else anim_param.frame_count
+    bone_keys = np.empty((key_count, len(pose_bones), 10), dtype=np.float32)
+    root_keys = None
+
+    # Decoding happens inside the windows generator and is timed there
+    for first_frame, basis, root in windows:
+        if progress:
+            progress.resume(frame_num=first_frame)
+        place_window_keys(bone_keys, first_frame, basis, loop_length)
+        if root is not None:
+            if root_keys is None:
+                root_keys = np.empty((key_count, 10), dtype=np.float32)
+            place_window_keys(root_keys, first_frame, root, loop_length)
+        yield
+
+    for i, pbone in enumerate(pose_bones):
+        with anim_data.timer.phase("keyframe"):
+            add_transform_fcurves(action, f"{pbone.path_from_id()}.", pbone.name, bone_keys[:, i])
+        yield
+    if root_keys is not None:
+        with anim_data.timer.phase("keyframe"):
+            add_transform_fcurves(action, "", "Object Transforms", root_keys)
+
+    # Same frame range as write_anim_data
+    action.use_frame_range = True
+    if loop_length:
+        action.use_cyclic = True
+        action.frame_start = loop_length
+        action.frame_end = 2 * loop_length
+    else:
+        action.frame_start = 0
+        action.frame_end = anim_param.frame_count - 1
+    return root_keys is not None
+
+
+def get_import_cache_dir():
+    return bpy.utils.user_resource('DATAFILES', path="FrontiersAnimationTools/import_cache", create=True)
+
+
+# Import cache with the settings of the scene's last import, None if it was made without the cache.
+# Whoever makes it evicts once they're done with it.
+def get_import_cache(scene):
+    if not scene.frontiers_use_import_cache:
+        return None
+    return PoseCache(get_import_cache_dir(), scene.frontiers_import_cache_size * 1024 * 1024)
+
+
+# Key a converted compressed animation into an action
+def write_anim_data(arm_active, action, anim_data):
+    anim_param = anim_data.param
+    for i, pbone in enumerate(arm_active.pose.bones):
+        add_transform_fcurves(action, f"{pbone.path_from_id()}.", pbone.name, anim_data.basis[:, i])
+
+    if anim_data.root is not None:
+        add_transform_fcurves(action, "", "Object Transforms", anim_data.root)
+
+    # Keyframes become invisible if this is set earlier than anim import.
+    action.use_frame_range = True
+    if anim_data.pad_loop:
+        action.use_cyclic = True
+        action.frame_start = anim_param.frame_count - 1
+        action.frame_end = 2 * (anim_param.frame_count - 1)
+    else:
+        action.frame_start = 0
+        action.frame_end = anim_param.frame_count - 1
+
+
+# Finish importing a placeholder action made by a register-only import, cache is from get_import_cache
+def load_pending_action(self_pass, arm_active, action, cache=None):
+    if not action.pxd_pending:
+        return True
+
+    enum_loop_check = "loop_yes" if action.pxd_pad_loop else "loop_no"
+    try:
+        anim_data = load_animation(bpy.path.abspath(action.pxd_source),
+                                   get_rig_binding(arm_active),
+                                   action.pxd_yx_skel,
+                                   action.pxd_root,
+                                   enum_loop_check,
+                                   cache)
+    except (OSError, ValueError) as error:
+        self_pass.report({'ERROR'}, f"{action.name}: {error}")
+        return False
+    if anim_data.error:
+        self_pass.report({'ERROR'}, f"{action.name}: {anim_data.error}")
+        return False
+    for warning in anim_data.warnings:
+        self_pass.report({'WARNING'}, warning)
+
+    write_anim_data(arm_active, action, anim_data)
+    action.pxd_pending = False
+    return True
+
+
 class FrontiersAnimImport(bpy.types.Operator, ImportHelper):
     bl_idname = "import_anim.frontiers_anim"
     bl_label = "Import"
@@ -246,11 +585,70 @@ class FrontiersAnimImport(bpy.types.Operator, ImportHelper):
         default="loop_no",
     )
 
+    bool_use_cache: BoolProperty(
+        name="Use Import Cache",
+        description="Keep converted animations on disk so importing the same file onto the same armature again "
+                    "skips decompression and conversion",
+        default=True,
+    )
+
+    int_cache_size: IntProperty(
+        name="Cache Size (MB)",
+        description="Least recently used cache entries are removed once the cache grows past this size",
+        default=2048,
+        min=64,
+    )
+
+    bool_register_only: BoolProperty(
+        name="Register Only",
+        description="Only read file headers and create empty placeholder actions. Each action is decoded and keyed "
+                    "the first time it is set as active or batch exported.\n\n"
+                    "(NOTE: Uncompressed animations are always imported right away)",
+        default=False,
+    )
+
+    bool_stream: BoolProperty(
+        name="Stream Long Animations",
+        description="Decode and key compressed animations longer than the window size a few frames at a time, "
+                    "keeping memory use bounded for very long clips.\n\n"
+                    "(NOTE: Streamed animations are not cached)",
+        default=False,
+    )
+
+    int_stream_window: IntProperty(
+        name="Window Size",
+        description="Number of frames decoded at once when streaming",
+        default=512,
+        min=16,
+    )
+
+    bool_responsive: BoolProperty(
+        name="Keep UI Responsive",
+        description="Import in short slices between redraws, so the viewport stays usable and finished animations "
+                    "can be inspected while the rest are imported. Press Esc to cancel, animations that were already "
+                    "imported are kept.\n\n"
+                    "(NOTE: Imports run from scripts or with profiling enabled always finish before returning)",
+        default=True,
+    )
+
+    bool_trace: BoolProperty(
+        name="Write Timing Trace",
+        description="Write the time each file spent in every import phase to frontiers_import_trace.json in the "
+                    "import folder. Opens in chrome://tracing or ui.perfetto.dev",
+        default=False,
+    )
+
+    bool_profile: BoolProperty(
+        name="Profile",
+        description="Profile this import and write frontiers_import.prof to the import folder, together with "
+                    "frontiers_import_profile.txt summarizing the slowest functions and the time spent compressing "
+                    "and decompressing. Attach both to bug reports about slow imports",
+        default=False,
+    )
+
     def __init__(self):
         self.bool_skel_conv = False
         self.keyframe_rules = set()
-        self.frame_count_loop = 0
-        self.pad_loop = False
 
     def draw(self, context):
         layout = self.layout
@@ -264,6 +662,12 @@ class FrontiersAnimImport(bpy.types.Operator, ImportHelper):
         ui_scene_row_root_motion = ui_scene_box.row()
         ui_scene_row_root_motion.prop(self, "bool_root_motion", )
 
+        ui_scene_row_register = ui_scene_box.row()
+        ui_scene_row_register.prop(self, "bool_register_only", )
+
+        ui_scene_row_responsive = ui_scene_box.row()
+        ui_scene_row_responsive.prop(self, "bool_responsive", )
+
         # Currently not working as expected, meant to only insert keyframes if local transform is different
         # ui_scene_row_needed = ui_scene_box.row()
         # ui_scene_row_needed.prop(self, "bool_keyframe_needed")
@@ -274,6 +678,28 @@ class FrontiersAnimImport(bpy.types.Operator, ImportHelper):
         ui_orientation_row = ui_bone_box.row()
         ui_orientation_row.prop(self, "bool_yx_skel", )
 
+        ui_stream_box = layout.box()
+        ui_stream_box.label(text="Streaming Settings", icon='SORTTIME')
+
+        ui_stream_box.row().prop(self, "bool_stream", )
+        ui_stream_window_row = ui_stream_box.row()
+        ui_stream_window_row.prop(self, "int_stream_window", )
+        ui_stream_window_row.enabled = self.bool_stream
+
+        ui_cache_box = layout.box()
+        ui_cache_box.label(text="Cache Settings", icon='FILE_CACHE')
+
+        ui_cache_box.row().prop(self, "bool_use_cache", )
+        ui_cache_size_row = ui_cache_box.row()
+        ui_cache_size_row.prop(self, "int_cache_size", )
+        ui_cache_size_row.enabled = self.bool_use_cache
+
+        ui_profile_box = layout.box()
+        ui_profile_box.label(text="Profiling Settings", icon='TIME')
+
+        ui_profile_box.row().prop(self, "bool_trace", )
+        ui_profile_box.row().prop(self, "bool_profile", )
+
     @classmethod
     def poll(cls, context):
         obj = context.active_object
@@ -282,218 +708,324 @@ class FrontiersAnimImport(bpy.types.Operator, ImportHelper):
         else:
             return False
 
+    @profiled("frontiers_import", lambda self: os.path.dirname(self.filepath))
     def execute(self, context):
-        # Scene check and setup
+        if not self.start_import(context):
+            return {'CANCELLED'}
+
+        # Profiles and scripted imports need everything done by the time the operator returns
+        if self.bool_responsive and not self.bool_profile and context.window and not bpy.app.background:
+            wm = context.window_manager
+            self.workspace = context.workspace
+            self.bool_defer_scene = True
+            self.timer = wm.event_timer_add(MODAL_INTERVAL, window=context.window)
+            wm.progress_begin(0, len(self.files))
+            wm.modal_handler_add(self)
+            self.update_status(context)
+            return {'RUNNING_MODAL'}
+
+        try:
+            self.import_next(context)
+        except BaseException:
+            self.cancel_import()
+            raise
+        self.finish_import(context)
+        return {'FINISHED'}
+
+    # Only runs between slices, everything else is passed on so the viewport stays usable
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            try:
+                self.cancel_import()
+            finally:
+                self.end_modal(context)
+            self.report({'WARNING'}, f"Import cancelled, {self.num_imported} of {len(self.files)} animations were "
+                                     f"imported.")
+            return self.get_cancel_result()
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        try:
+            self.arm_active.name
+        except ReferenceError:
+            try:
+                self.cancel_import()
+            finally:
+                self.end_modal(context)
+            self.report({'ERROR'}, "Armature was deleted, import cancelled.")
+            return self.get_cancel_result()
+
+        try:
+            done = self.import_next(context, time.perf_counter() + MODAL_SLICE)
+        except BaseException:
+            try:
+                self.cancel_import()
+            finally:
+                self.end_modal(context)
+            raise
+        if not done:
+            self.update_status(context)
+            return {'PASS_THROUGH'}
+
+        try:
+            self.finish_import(context)
+        finally:
+            self.end_modal(context)
+        return {'FINISHED'}
+
+    # Actions imported before cancelling are kept, finishing pushes an undo step for them so the next undo doesn't
+    # quietly take them back along with whatever came before the import
+    def get_cancel_result(self):
+        if self.num_imported:
+            return {'FINISHED'}
+        return {'CANCELLED'}
+
+    def update_status(self, context):
+        context.window_manager.progress_update(self.num_handled)
+        self.workspace.status_text_set(f"Importing PXD animations: {self.num_handled} / {len(self.files)}  "
+                                       f"{self.progress.item_name}  (Esc to cancel)")
+
+    def end_modal(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+        self.workspace.status_text_set(None)
+
+    # Scene check and setup, returns False if there's nothing to import onto
+    def start_import(self, context):
         arm_active = context.active_object
-        scene_active = context.scene
 
         if not arm_active:
             self.report({'INFO'}, f"No active armature. Please select an armature.")
-            return {'CANCELLED'}
+            return False
         if arm_active.type != 'ARMATURE':
             self.report({'INFO'}, f"Active object \"{arm_active.name}\" is not an armature. Please select an armature.")
-            return {'CANCELLED'}
+            return False
 
         arm_active.rotation_mode = 'QUATERNION'
-        bone_count = len(arm_active.pose.bones)
         for bone in arm_active.data.bones:
             bone.inherit_scale = 'ALIGNED'
+        self.arm_active = arm_active
 
         # Status logging
         self.progress = BatchProgress(self, num_items=len(self.files), method='IMPORT')
 
-        for f, file in enumerate(self.files):
-            # Begin import
-            anim_file = open(os.path.join(os.path.dirname(self.filepath), file.name), "rb")
-            anim_param = PXDAnimParam(anim_file)
-            self.progress.update_frame_count(anim_param.frame_count)
-            self.progress.resume(frame_num=-1, name=file.name, item_num=f)
-
-            if (not anim_param) or anim_param.error:
-                self.progress.update_error(name=file_name, error=anim_param.error)
-                continue
-
-            scene_active.render.fps = int(round(anim_param.frame_rate))
-            scene_active.render.fps_base = scene_active.render.fps / anim_param.frame_rate
-
-            if bone_count != anim_param.track_count:
-                self.report(
-                    {'WARNING'},
-                    f"Bone count of \"{arm_active.data.name}\" ({bone_count}) does not match track count of \"{file.name}\" ({anim_param.track_count}). Results may not turn out as expected."
-                )
-
-            anim_name = file.name
-            for ext in [".outanim", ".anm", ".pxd"]:
-                anim_name = anim_name.replace(ext, "")
-            anim_param.name = anim_name
-            arm_active.animation_data_create()
-            action_active = bpy.data.actions.new(anim_name)
-            arm_active.animation_data.action = action_active
-            action_active.use_frame_range = True
+        # Worker threads read, decompress and convert files ahead of the main thread, which only creates actions.
+        # Results are consumed in file order and only a few are kept in flight to cap memory use.
+        self.binding = get_rig_binding(arm_active)
+        self.skeleton_library = get_skeleton_library(context.scene)
+        # Remembered on the scene, register-only actions decoded later use the same cache settings
+        context.scene.frontiers_use_import_cache = self.bool_use_cache
+        context.scene.frontiers_import_cache_size = self.int_cache_size
+        self.cache = get_import_cache(context.scene)
+        self.base_dir = os.path.dirname(self.filepath)
+        self.worker_count = max(1, min(os.cpu_count() or 1, len(self.files)))
+        self.executor = ThreadPoolExecutor(max_workers=self.worker_count)
+        self.file_queue = deque(enumerate(self.files))
+        self.pending = deque()
+        self.current = None  # (file name, anim data, import_anim_data generator) of the action being keyed
+        self.partial_action = None  # Action created by import_anim_data that isn't fully keyed yet
+        self.num_handled = 0
+        self.num_imported = 0
+        # Responsive imports leave the active action and scene alone while running, see show_action
+        self.bool_defer_scene = False
+        self.start_action = arm_active.animation_data.action if arm_active.animation_data else None
+        self.last_imported = None  # (action, frame rate) shown once a responsive import finishes
+
+        for _ in range(self.worker_count * 2):
+            self.submit_next()
+        return True
 
-            self.keyframe_rules = set()
+    def submit_next(self):
+        if self.file_queue:
+            f, file = self.file_queue.popleft()
+            future = self.executor.submit(load_animation,
+                                          os.path.join(self.base_dir, file.name),
+                                          self.binding,
+                                          self.bool_yx_skel,
+                                          self.bool_root_motion,
+                                          self.enum_loop_check,
+                                          self.cache,
+                                          self.bool_register_only,
+                                          self.int_stream_window if self.bool_stream else 0)
+            self.pending.append((f, file, future))
+
+    # Create actions until every file is imported or the deadline passes, returns True once everything is imported.
+    # Without a deadline this blocks until the end. With one, it returns early instead of waiting on worker threads.
+    def import_next(self, context, deadline=None):
+        while True:
+            if self.current is None:
+                if not self.pending:
+                    return True
+                f, file, future = self.pending[0]
+                if deadline is not None and not future.done():
+                    return False
+                self.pending.popleft()
+                self.submit_next()
+                self.num_handled += 1
+                self.progress.resume(frame_num=-1, name=file.name, item_num=f)
+                try:
+                    anim_data = future.result()
+                except Exception as error:
+                    self.progress.update_error(name=file.name, error=error)
+                    continue
+                self.current = (file.name, anim_data, self.import_anim_data(context, self.arm_active, anim_data))
+
+            name, anim_data, steps = self.current
+            try:
+                next(steps)
+            except StopIteration as result:
+                self.current = None
+                self.partial_action = None
+                if result.value:
+                    self.num_imported += 1
+                self.progress.add_timings(name, anim_data.timer)
+
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+
+    def finish_import(self, context):
+        # Show the last animation unless the user picked another action while the import was running
+        if self.last_imported:
+            action, frame_rate = self.last_imported
+            try:
+                if self.arm_active.animation_data.action == self.start_action:
+                    self.show_action(context, action, frame_rate)
+            except ReferenceError:
+                pass
+
+        self.executor.shutdown()
+        self.close_import()
+
+    # Runs however the import ends, the workers have to be stopped first so nothing is cached after eviction
+    def close_import(self, num_cancelled=None):
+        if self.cache:
+            self.cache.evict()
+        trace_path = os.path.join(self.base_dir, "frontiers_import_trace.json") if self.bool_trace else None
+        self.progress.finish(trace_path, num_cancelled)
+
+    # Stop the workers and remove the action that was being keyed, actions that were already finished are kept.
+    # The armature or the action may already be gone, deleted by the user or freed by undo.
+    def cancel_import(self):
+        # Files that haven't been started are dropped, only the ones being decoded right now are waited for
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.current:
+            self.current[2].close()
+            self.current = None
+        partial_action = self.partial_action
+        self.partial_action = None
+        if partial_action:
+            try:
+                if self.arm_active.animation_data and self.arm_active.animation_data.action == partial_action:
+                    self.arm_active.animation_data.action = None
+            except ReferenceError:
+                pass
+            try:
+                bpy.data.actions.remove(partial_action)
+            except ReferenceError:
+                pass
+        self.close_import(self.num_imported)
+
+    # Generator, streamed animations yield after every window and the result is returned once the action is done
+    def import_anim_data(self, context, arm_active, anim_data):
+        anim_param = anim_data.param
+        if anim_data.error:
+            self.progress.update_error(name=os.path.basename(anim_data.filepath), error=anim_data.error)
+            return False
+        self.progress.update_frame_count(anim_param.frame_count)
+        for warning in anim_data.warnings:
+            self.report({'WARNING'}, warning)
 
-            if self.enum_loop_check == "loop_yes" or (self.enum_loop_check == "loop_auto" and "_loop" in anim_name):
-                self.pad_loop = True
-
-            # frame_count_loop used ubiquitously in case of padding
-            if self.pad_loop and anim_param.is_compressed:
-                self.keyframe_rules.add('INSERTKEY_CYCLE_AWARE')
-                self.frame_count_loop = 3 * (anim_param.frame_count - 1) + 1
-                # Weird Blender behavior requires this to be set later
-                # action_active.frame_start = anim_param.frame_count - 1
-                # action_active.frame_end = self.frame_count_loop - anim_param.frame_count
-                action_active.use_cyclic = True
-            else:
-                self.frame_count_loop = anim_param.frame_count
-                scene_active.frame_start = action_active.frame_start = 0
-                scene_active.frame_end = action_active.frame_end = self.frame_count_loop - 1
-
-            action_active.pxd_export = True
-            action_active.pxd_fps = anim_param.frame_rate
-            action_active.pxd_root = self.bool_root_motion
-            action_active.pxd_compress = anim_param.is_compressed
-            action_active.pxd_additive = anim_param.is_additive
-
-            if anim_param.is_compressed:
-                import_action = self.import_compressed(arm_active, anim_file, anim_param)
+        bone_count = len(arm_active.pose.bones)
+        if bone_count != anim_param.track_count:
+            self.report(
+                {'WARNING'},
+                f"Bone count of \"{arm_active.data.name}\" ({bone_count}) does not match track count of \"{os.path.basename(anim_data.filepath)}\" ({anim_param.track_count}). Results may not turn out as expected."
+            )
+            if self.skeleton_library:
+                candidates = self.skeleton_library.find_by_bone_count(anim_param.track_count)
+                if candidates:
+                    self.report({'INFO'}, f"Skeletons in the library with {anim_param.track_count} bones: "
+                                          f"{', '.join(os.path.basename(path) for path in candidates)}")
+
+        arm_active.animation_data_create()
+        action_active = bpy.data.actions.new(anim_data.name)
+        self.partial_action = action_active
+        action_active.use_frame_range = True
+
+        action_active.pxd_export = True
+        action_active.pxd_fps = anim_param.frame_rate
+        action_active.pxd_root = self.bool_root_motion
+        action_active.pxd_compress = anim_param.is_compressed
+        action_active.pxd_additive = anim_param.is_additive
+
+        # Everything needed to finish the import later
+        action_active.pxd_source = anim_data.filepath
+        action_active.pxd_yx_skel = self.bool_yx_skel
+        action_active.pxd_pad_loop = anim_data.pad_loop
+
+        if anim_param.is_compressed:
+            if self.bool_register_only:
+                action_active.pxd_pending = True
+                action_active.frame_start = 0
+                action_active.frame_end = anim_param.frame_count - 1
+            elif anim_data.stream:
+                windows = iter_animation_windows(anim_data, self.binding, self.bool_yx_skel, self.bool_root_motion,
+                                                 self.int_stream_window)
+                try:
+                    has_root = yield from write_anim_windows(arm_active, action_active, anim_data, windows,
+                                                             self.progress)
+                except (OSError, ValueError) as error:
+                    self.partial_action = None
+                    bpy.data.actions.remove(action_active)
+                    self.progress.update_error(name=os.path.basename(anim_data.filepath), error=error)
+                    return False
+                for warning in anim_data.warnings:
+                    self.report({'WARNING'}, warning)
+                if not has_root and self.bool_root_motion and anim_param.root_offset is None:
+                    self.report({'INFO'}, "No root motion chunk found.")
             else:
+                with anim_data.timer.phase("keyframe"):
+                    write_anim_data(arm_active, action_active, anim_data)
+                if anim_data.root is None and self.bool_root_motion:
+                    self.report({'INFO'}, "No root motion chunk found.")
+        else:
+            self.keyframe_rules = set()
+            action_active.frame_start = 0
+            action_active.frame_end = anim_param.frame_count - 1
+            # Reading and converting uncompressed frames is interleaved with keying them.
+            # Keys are inserted through the pose, so the action has to be active while that happens.
+            previous_action = arm_active.animation_data.action
+            arm_active.animation_data.action = action_active
+            with anim_data.timer.phase("keyframe"), open(anim_data.filepath, "rb") as anim_file:
                 import_action = self.import_uncompressed(arm_active, anim_file, anim_param)
-            anim_file.close()
-            del anim_file
+            if self.bool_defer_scene:
+                arm_active.animation_data.action = previous_action
             if not import_action:
-                self.progress.update_error(error=f"{file.name} compressed animation import couldn't be processed. File skipped.")
-                continue
+                self.progress.update_error(error=f"{anim_data.name} animation import couldn't be processed. File skipped.")
+                return False
 
             # Mainly for uncompressed actions, doesn't really affect actions where every possible keyframe is filled
             for fcurve in action_active.fcurves:
                 for point in fcurve.keyframe_points:
                     point.interpolation = 'LINEAR'
 
-            # Keyframes become invisible if this is set earlier than anim import.
-            if self.pad_loop and anim_param.is_compressed:
-                scene_active.frame_start = action_active.frame_start = anim_param.frame_count - 1
-                scene_active.frame_end = action_active.frame_end = self.frame_count_loop - anim_param.frame_count
-
-        self.progress.finish()
-
-        return {'FINISHED'}
-
-    def import_compressed(self, arm_active, anim_file, anim_data):
-        frame_count = anim_data.frame_count
-        track_count = anim_data.track_count
-        bone_count = len(arm_active.data.bones)
-        main_offset = anim_data.main_offset
-        root_offset = anim_data.root_offset
-
-        anim_file.seek(main_offset)
-        main_buffer_length = int.from_bytes(anim_file.read(4), byteorder='little')
-        anim_file.seek(main_offset)
-        main_buffer_compressed = anim_file.read(main_buffer_length)
-        main_buffer = decompress(main_buffer_compressed)
-        if not len(main_buffer.getvalue()):
-            self.progress.update_error(error=f"{anim_data.name} buffer failed to initialize. File skipped.")
-            return False
-        del main_buffer_compressed
-
-        if self.bool_root_motion and (root_offset is not None):
-            anim_file.seek(root_offset, 0)
-            root_buffer_length = int.from_bytes(anim_file.read(4), byteorder='little')
-            anim_file.seek(root_offset, 0)
-            root_buffer_compressed = anim_file.read(root_buffer_length)
-            root_buffer = decompress(root_buffer_compressed)
-            if not len(root_buffer.getvalue()):
-                self.report({'WARNING'},f"{anim_data.name} root buffer failed to initialize. Importing without root motion.")
-                root_buffer = None
-            del root_buffer_compressed
+        if self.bool_defer_scene:
+            self.last_imported = (action_active, anim_param.frame_rate)
         else:
-            root_buffer = None
-
-        # Nice for sanity check, but not necessary
-        duration_acl = struct.unpack('<f', main_buffer.read(0x4))[0]
-        frame_rate_acl = struct.unpack('<f', main_buffer.read(0x4))[0]
-        frame_count_acl = int.from_bytes(main_buffer.read(4), byteorder='little')
-        track_count_acl = int.from_bytes(main_buffer.read(4), byteorder='little')
-
-        for frame in range(self.frame_count_loop):
-            self.progress.resume(frame_num=frame)
-            if self.pad_loop:
-                main_buffer.seek(0x10 + (0x30 * track_count * (frame % (frame_count - 1))))
-            else:
-                main_buffer.seek(0x10 + (0x30 * track_count * frame))
-
-            matrix_map_local = {}
-            scale_map = {}
-
-            for i in range(bone_count):
-                pbone = arm_active.pose.bones[i]
-                if i in range(track_count):
-                    r0, r1, r2, r3 = struct.unpack('<ffff', main_buffer.read(0x10))
-                    p0, p1, p2 = struct.unpack('<fff', main_buffer.read(0xC))
-                    main_buffer.read(4)  # Float: Bone length
-                    s0, s1, s2 = struct.unpack('<fff', main_buffer.read(0xC))
-                    main_buffer.read(4)  # Float: 1.0
-
-                    if self.bool_yx_skel:
-                        tmp_rot = mathutils.Quaternion((r3, r2, r0, r1))
-                        tmp_loc = mathutils.Vector((p2, p0, p1))
-                        if not pbone.parent:
-                            tmp_rot @= mathutils.Quaternion((0.5, -0.5, -0.5, -0.5))
-                    else:
-                        tmp_rot = mathutils.Quaternion((r3, r0, r1, r2))
-                        tmp_loc = mathutils.Vector((p0, p1, p2))
-
-                    matrix = mathutils.Matrix.LocRotScale(tmp_loc, tmp_rot, mathutils.Vector((1.0, 1.0, 1.0)))
-                    matrix_map_local.update({pbone.name: matrix})
-
-                    if (s0, s1, s2) != (0.0, 0.0, 0.0):
-                        if self.bool_yx_skel:
-                            tmp_scale = mathutils.Vector((s2, s0, s1))
-                        else:
-                            tmp_scale = mathutils.Vector((s0, s1, s2))
-                    else:
-                        tmp_scale = mathutils.Vector((1.0, 1.0, 1.0))
-
-                    scale_map.update({pbone.name: tmp_scale})
-                else:
-                    matrix_map_local.update({pbone.name: mathutils.Matrix()})
-                    scale_map.update({pbone.name: mathutils.Vector((1.0, 1.0, 1.0))})
-
-            matrix_map_global = get_matrix_map_global(arm_active, matrix_map_local, scale_map)
-            set_pose_matrices_global(arm_active, matrix_map_global, frame, keyframe_rules=self.keyframe_rules, is_compressed=True)
-
-            if root_buffer:
-                if self.pad_loop:
-                    root_buffer.seek(0x10 + (0x30 * (frame % (frame_count - 1))))
-                else:
-                    root_buffer.seek(0x10 + (0x30 * frame))
-
-                r0, r1, r2, r3 = struct.unpack('<ffff', root_buffer.read(0x10))
-                p0, p1, p2 = struct.unpack('<fff', root_buffer.read(0xC))
-                root_buffer.read(4)  # Float: Bone length
-                s0, s1, s2 = struct.unpack('<fff', root_buffer.read(0xC))
-                root_buffer.read(4)  # Float: 1.0
-
-                tmp_rot = mathutils.Quaternion((RMS, RMS, 0.0, 0.0))
-                tmp_rot @= mathutils.Quaternion((r3, r0, r1, r2))
-                tmp_loc = mathutils.Vector((p0, -p2, p1))
-                if (s0, s1, s2) != (0.0, 0.0, 0.0):
-                    tmp_scale = mathutils.Vector((s0, s1, s2))
-                else:
-                    tmp_scale = mathutils.Vector((1.0, 1.0, 1.0))
-
-                arm_active.rotation_quaternion = tmp_rot
-                arm_active.location = tmp_loc
-                arm_active.scale = tmp_scale
-
-                arm_active.keyframe_insert('rotation_quaternion', frame=frame, options=self.keyframe_rules)
-                arm_active.keyframe_insert('location', frame=frame, options=self.keyframe_rules)
-                arm_active.keyframe_insert('scale', frame=frame, options=self.keyframe_rules)
-
-            elif self.bool_root_motion and not root_buffer:
-                self.report({'INFO'}, "No root motion chunk found.")
+            self.show_action(context, action_active, anim_param.frame_rate)
         return True
 
+    # Make the action active and fit the scene's frame rate and range to it
+    def show_action(self, context, action, frame_rate):
+        scene_active = context.scene
+        scene_active.render.fps = int(round(frame_rate))
+        scene_active.render.fps_base = scene_active.render.fps / frame_rate
+        self.arm_active.animation_data.action = action
+        scene_active.frame_start = round(action.frame_start)
+        scene_active.frame_end = round(action.frame_end)
+
     def import_uncompressed(self, arm_active, anim_file, anim_data):
         frame_count = anim_data.frame_count
         track_count = anim_data.track_count
@@ -1,13 +1,50 @@
 import bpy
 import os
+import json
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from bpy_extras.io_utils import ExportHelper
 from bpy.props import (BoolProperty,
+                       FloatProperty,
+                       IntProperty,
                        StringProperty,
                        CollectionProperty
                        )
-from .anim_export import anim_export
+from .anim_export import (sample_export_data,
+                          sample_scene,
+                          write_export_data,
+                          get_fast_sample_blocker,
+                          get_preroll_requirement,
+                          )
+from .pxd_writer import KEY_TOLERANCE
+from .anim_import import load_pending_action, get_rig_binding, get_import_cache
+from .export_manifest import ExportManifest, hash_action, hash_action_keys
 from ..ui.func_ops import filter_actions
 from .console_output import BatchProgress
+from ..profiling import profiled
+
+# Run with "blender --background <file> --python batch_worker.py -- <job file>" by distributed exports
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), "batch_worker.py")
+ADDON_PACKAGE = __package__.rpartition('.')[0]
+
+
+def get_file_name(action):
+    return f"{action.name}.anm.pxd"
+
+
+# Write an animation identical to one queued before it, reusing that one's encoded data
+def write_duplicate(filepath, export_data, original_data, original_future):
+    try:
+        original_future.result()
+    except Exception:
+        pass
+    # Encode it separately if the original couldn't be encoded
+    if original_data.is_encoded():
+        export_data.reuse_encoded(original_data)
+    return write_export_data(filepath, export_data)
 
 
 class FrontiersAnimBatchExport(bpy.types.Operator, ExportHelper):
@@ -31,10 +68,72 @@ class FrontiersAnimBatchExport(bpy.types.Operator, ExportHelper):
         description="Enable to start sampling the animation from frame 0 regardless of the specified frame range. "
                     "Will not affect output frame range.\n\n"
                     "(NOTE: Will take longer if animation starts in middle of timeline, but useful for advanced users "
-                    "using features such as physics simulations)",
+                    "using features such as physics simulations. Skipped if nothing in the scene is simulated)",
         default=False,
     )
 
+    bool_fast_sample: BoolProperty(
+        name="Fast Sampling",
+        description="Read poses straight from each action's F-Curves instead of updating the whole scene every frame. "
+                    "Falls back to normal sampling if the armature has constraints, drivers or NLA tracks.\n\n"
+                    "(NOTE: \"Sample From Frame 0\" has no effect on fast sampled actions)",
+        default=True,
+    )
+
+    bool_incremental: BoolProperty(
+        name="Skip Unchanged Actions",
+        description="Skip actions whose keys, frame range, settings and armature haven't changed since they were last "
+                    "exported to this folder. Tracked in a manifest file in the output folder.\n\n"
+                    "(NOTE: Actions affected by constraints or drivers are always exported)",
+        default=True,
+    )
+
+    bool_dedup: BoolProperty(
+        name="Reuse Identical Clips",
+        description="Compress actions that sample to exactly the same data only once and report the groups of "
+                    "identical actions found",
+        default=True,
+    )
+
+    float_key_tolerance: FloatProperty(
+        name="Key Tolerance",
+        description="Keys of actions exported uncompressed are dropped wherever interpolating between their "
+                    "neighbours stays within this distance of the sampled value",
+        default=KEY_TOLERANCE,
+        min=0.0,
+        precision=5,
+    )
+
+    int_workers: IntProperty(
+        name="Background Workers",
+        description="Split the export across this many background Blender processes working on a saved copy of "
+                    "this file. 0 exports everything in this Blender instance.\n\n"
+                    "(NOTE: Each worker loads the whole file, so memory use grows with the number of workers)",
+        default=0,
+        min=0,
+    )
+
+    bool_trace: BoolProperty(
+        name="Write Timing Trace",
+        description="Write the time each action spent in every export phase to frontiers_export_trace.json in the "
+                    "output folder. Opens in chrome://tracing or ui.perfetto.dev.\n\n"
+                    "(NOTE: Actions exported by background workers are not included)",
+        default=False,
+    )
+
+    bool_profile: BoolProperty(
+        name="Profile",
+        description="Profile this batch export and write frontiers_batch_export.prof to the output folder, "
+                    "together with frontiers_batch_export_profile.txt summarizing the slowest functions and the "
+                    "time spent compressing and decompressing. Attach both to bug reports about slow batch exports",
+        default=False,
+    )
+
+    # Set on background workers, path of the job file listing the actions to export and where to put results
+    worker_job: StringProperty(
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
     def __init__(self):
         self.bool_root_motion = False
         self.bool_compress = True
@@ -56,6 +155,16 @@ class FrontiersAnimBatchExport(bpy.types.Operator, ExportHelper):
 
         ui_zero_row = ui_scene_box.row()
         ui_zero_row.prop(self, "bool_start_zero", )
+        ui_fast_row = ui_scene_box.row()
+        ui_fast_row.prop(self, "bool_fast_sample", )
+        ui_incremental_row = ui_scene_box.row()
+        ui_incremental_row.prop(self, "bool_incremental", )
+        ui_dedup_row = ui_scene_box.row()
+        ui_dedup_row.prop(self, "bool_dedup", )
+        ui_tolerance_row = ui_scene_box.row()
+        ui_tolerance_row.prop(self, "float_key_tolerance", )
+        ui_workers_row = ui_scene_box.row()
+        ui_workers_row.prop(self, "int_workers", )
 
         ui_bone_box = layout.box()
         ui_bone_box.label(text="Armature Settings", icon='ARMATURE_DATA')
@@ -63,51 +172,316 @@ class FrontiersAnimBatchExport(bpy.types.Operator, ExportHelper):
         ui_orientation_row = ui_bone_box.row()
         ui_orientation_row.prop(self, "bool_yx_skel", )
 
+        ui_profile_box = layout.box()
+        ui_profile_box.label(text="Profiling Settings", icon='TIME')
+
+        ui_profile_box.row().prop(self, "bool_trace", )
+        ui_profile_box.row().prop(self, "bool_profile", )
+
+    @profiled("frontiers_batch_export", lambda self: os.path.dirname(self.filepath))
     def execute(self, context):
         base_dir = os.path.dirname(self.filepath)
         arm_active = context.active_object
         scene_active = context.scene
         frame_active = scene_active.frame_current
         action_active = arm_active.animation_data.action
-        filtered_actions = filter_actions(bpy.data.actions, context)
+
+        if self.worker_job:
+            with open(self.worker_job, "r", encoding='utf-8') as file:
+                job = json.load(file)
+            filtered_actions = [bpy.data.actions[name] for name in job["actions"] if name in bpy.data.actions]
+        else:
+            filtered_actions = filter_actions(bpy.data.actions, context)
 
         progress = BatchProgress(self, num_items=len(filtered_actions), method='EXPORT')
 
+        # Workers export exactly what they're given, the manifest is only handled by the process that started them
+        self.manifest = None if self.worker_job else ExportManifest(base_dir)
+        self.binding_hash = get_rig_binding(arm_active).hash
+        self.clip_groups = {}  # Hash of sampled data: names of all actions with it
+        self.exported = []
+        self.export_errors = []
+
+        num_skipped = 0
+        queue = []
         for i, action in enumerate(filtered_actions):
             progress.resume(item_num=i, name=action.name)
+            action_hash = self.get_action_hash(arm_active, action) if self.manifest else None
+            if self.bool_incremental and action_hash and self.manifest.is_current(get_file_name(action), action_hash):
+                num_skipped += 1
+                continue
+            queue.append((i, action, action_hash))
 
-            if action.pxd_root:
-                self.bool_root_motion = True
-            else:
-                self.bool_root_motion = False
+        if self.int_workers and not self.worker_job and len(queue) > 1:
+            self.export_distributed(arm_active, queue, progress)
+        else:
+            # Register-only actions are decoded as they come up, the cache is trimmed once they're all done
+            self.import_cache = get_import_cache(scene_active)
+            self.export_local(arm_active, queue, base_dir, progress)
+            if self.import_cache:
+                self.import_cache.evict()
 
-            if action.pxd_additive:
-                self.bool_additive = True
-            else:
-                self.bool_additive = False
+        if self.manifest:
+            self.manifest.save()
+        if num_skipped:
+            self.report({'INFO'}, f"Skipped {num_skipped} unchanged actions.")
 
-            # TODO: Implement uncompressed animation export
-            # if action.pxd_compress:
-                # self.bool_compress = True
-            # else:
-                # self.bool_compress = False
+        duplicate_groups = [names for names in self.clip_groups.values() if len(names) > 1]
+        if duplicate_groups:
+            self.report({'INFO'}, f"Found {len(duplicate_groups)} groups of identical actions.")
+            for names in duplicate_groups:
+                self.report({'INFO'}, f"Identical: {', '.join(names)}")
 
-            action_path = f"{base_dir}\\{action.name}.anm.pxd"
-            arm_active.animation_data.action = action
-            frame_rate = action.pxd_fps
-            if not anim_export(self,
-                               action_path,
-                               arm_active,
-                               action,
-                               round(action.frame_start),
-                               round(action.frame_end),
-                               frame_rate,
-                               ):
-                progress.update_error(name=action.name)
-
-        progress.finish()
+        if self.worker_job:
+            result = {"exported": self.exported,
+                      "failed": progress.error_list,
+                      "errors": self.export_errors,
+                      "clip_groups": self.clip_groups,
+                      }
+            with open(job["result"], "w", encoding='utf-8') as file:
+                json.dump(result, file)
+        trace_path = None
+        if self.bool_trace and not self.worker_job:
+            trace_path = os.path.join(base_dir, "frontiers_export_trace.json")
+        progress.finish(trace_path)
 
         # Restore previous scene params
         arm_active.animation_data.action = action_active
         scene_active.frame_current = frame_active
         return {'FINISHED'}
+
+    # Hash of everything the exported file depends on, None if the action should always be exported
+    def get_action_hash(self, arm_active, action):
+        arm_active.animation_data.action = action
+        if get_fast_sample_blocker(arm_active, action, action.pxd_root):
+            return None
+        settings = [self.bool_yx_skel, self.bool_start_zero, action.pxd_compress]
+        if not action.pxd_compress:
+            settings.append(self.float_key_tolerance)
+        try:
+            return hash_action(action, arm_active, self.binding_hash, round(action.frame_start), round(action.frame_end),
+                               settings)
+        except OSError:
+            return None
+
+    def record_result(self, progress, name, file_name, action_hash, error):
+        if error:
+            self.report({'WARNING'}, error)
+            self.export_errors.append(error)
+            progress.update_error(name=name)
+            if self.manifest:
+                self.manifest.remove(file_name)
+            return
+
+        self.exported.append(name)
+        if not self.manifest:
+            return
+        if action_hash:
+            self.manifest.update(file_name, action_hash)
+        else:
+            self.manifest.remove(file_name)
+
+    def export_local(self, arm_active, queue, base_dir, progress):
+        # The main thread samples while worker threads compress and write the actions sampled before.
+        # Only a few sampled actions are kept waiting to cap memory use.
+        worker_count = max(1, min(os.cpu_count() or 1, len(queue)))
+        pending = deque()
+        self.unique_clips = {}  # Hash of sampled data: (export data, write future) of the first action with it
+        self.plan_shared_passes(arm_active, queue)
+
+        def finish_oldest():
+            name, file_name, action_hash, future, timer = pending.popleft()
+            try:
+                error = future.result()
+            except Exception as exception:
+                error = f"{name}: {exception}"
+            self.record_result(progress, name, file_name, action_hash, error)
+            progress.add_timings(name, timer)
+
+        with ThreadPoolExecutor(max_workers=worker_count) as executor:
+            for i, action, action_hash in queue:
+                progress.resume(item_num=i, name=action.name)
+                if not self.submit_action(arm_active, action, action_hash, base_dir, executor, pending):
+                    progress.update_error(name=action.name)
+                while len(pending) > worker_count * 2:
+                    finish_oldest()
+
+            while pending:
+                finish_oldest()
+        del self.unique_clips
+
+    # Export through background Blender processes, each one running this operator on a shard of the actions
+    def export_distributed(self, arm_active, queue, progress):
+        worker_count = min(self.int_workers, len(queue))
+        job_dir = tempfile.mkdtemp(prefix="frontiers_export_")
+
+        # Saved copy so workers also see unsaved changes
+        blend_path = os.path.join(job_dir, "batch_export.blend")
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True, check_existing=False)
+
+        settings = {"bool_yx_skel": self.bool_yx_skel,
+                    "bool_start_zero": self.bool_start_zero,
+                    "bool_fast_sample": self.bool_fast_sample,
+                    "bool_dedup": self.bool_dedup,
+                    "float_key_tolerance": self.float_key_tolerance,
+                    "bool_incremental": False,
+                    }
+        workers = []
+        for w in range(worker_count):
+            shard = queue[w::worker_count]
+            job_path = os.path.join(job_dir, f"job_{w}.json")
+            log_path = os.path.join(job_dir, f"worker_{w}.log")
+            job = {"package": ADDON_PACKAGE,
+                   "armature": arm_active.name,
+                   "filepath": self.filepath,
+                   "actions": [action.name for i, action, action_hash in shard],
+                   "settings": settings,
+                   "result": os.path.join(job_dir, f"result_{w}.json"),
+                   }
+            with open(job_path, "w", encoding='utf-8') as file:
+                json.dump(job, file)
+            with open(log_path, "w", encoding='utf-8') as log:
+                process = subprocess.Popen([bpy.app.binary_path, "--background", blend_path,
+                                            "--python", WORKER_SCRIPT, "--", job_path],
+                                           stdout=log, stderr=subprocess.STDOUT)
+            workers.append((process, job, shard, log_path))
+
+        print(f"Exporting with {worker_count} background workers...")
+        keep_logs = False
+        for process, job, shard, log_path in workers:
+            return_code = process.wait()
+            try:
+                with open(job["result"], "r", encoding='utf-8') as file:
+                    result = json.load(file)
+            except (OSError, ValueError):
+                keep_logs = True
+                self.report({'ERROR'}, f"Background worker exited with code {return_code}, see {log_path}")
+                for i, action, action_hash in shard:
+                    progress.update_error(name=action.name)
+                continue
+
+            for error in result["errors"]:
+                self.report({'WARNING'}, error)
+            failed = set(result["failed"])
+            exported = set(result["exported"])
+            for i, action, action_hash in shard:
+                progress.resume(item_num=i, name=action.name)
+                if action.name in exported:
+                    self.record_result(progress, action.name, get_file_name(action), action_hash, None)
+                elif action.name in failed:
+                    progress.update_error(name=action.name)
+                    if self.manifest:
+                        self.manifest.remove(get_file_name(action))
+            for clip_hash, names in result["clip_groups"].items():
+                self.clip_groups.setdefault(clip_hash, []).extend(names)
+
+        if keep_logs:
+            os.remove(blend_path)
+        else:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    # With "Sample From Frame 0", every action sampled through the scene steps through its own pre-roll.
+    # Actions with the same keys evaluate identically, so one pass from frame 0 to the last frame any of them needs
+    # samples all of them and the pre-roll is only simulated once.
+    def plan_shared_passes(self, arm_active, queue):
+        self.shared_passes = {}  # Keys hash: [first frame, last frame, samples, actions left]
+        self.pass_keys = {}  # Action name: keys hash of its shared pass
+        if not self.bool_start_zero:
+            return
+        requirement = get_preroll_requirement(bpy.context.scene)
+        if not requirement:
+            self.report({'INFO'}, "Nothing in the scene depends on previous frames, skipping the pre-roll from "
+                                  "frame 0.")
+            return
+
+        groups = {}
+        for i, action, action_hash in queue:
+            arm_active.animation_data.action = action
+            if self.bool_fast_sample and not get_fast_sample_blocker(arm_active, action, action.pxd_root):
+                continue
+            try:
+                keys_hash = hash_action_keys(action)
+            except OSError:
+                continue
+            groups.setdefault(keys_hash, []).append(action)
+
+        for keys_hash, actions in groups.items():
+            if len(actions) < 2:
+                continue
+            self.shared_passes[keys_hash] = [min(round(action.frame_start) for action in actions),
+                                             max(round(action.frame_end) for action in actions),
+                                             None,
+                                             len(actions),
+                                             ]
+            for action in actions:
+                self.pass_keys[action.name] = keys_hash
+        if self.shared_passes:
+            self.report({'INFO'}, f"Pre-roll needed for {requirement}, sharing it between "
+                                  f"{len(self.pass_keys)} actions in {len(self.shared_passes)} passes.")
+
+    # This action's frames from its shared pass, None if it's sampled on its own
+    def get_shared_samples(self, arm_active, action, start_frame, end_frame):
+        keys_hash = self.pass_keys.get(action.name)
+        if keys_hash is None:
+            return None
+        shared_pass = self.shared_passes[keys_hash]
+        pass_start, pass_end, samples, actions_left = shared_pass
+        if samples is None:
+            samples = sample_scene(self, arm_active, pass_start, pass_end, True)
+            shared_pass[2] = samples
+        shared_pass[3] -= 1
+        if not shared_pass[3]:
+            del self.shared_passes[keys_hash]
+
+        # Copies, sample_export_data modifies the samples in place and frame ranges in a group can overlap
+        frames = slice(start_frame - pass_start, end_frame - pass_start + 1)
+        return tuple(sample[frames].copy() for sample in samples)
+
+    # Sample an action and queue it for writing, returns False if it couldn't be sampled
+    def submit_action(self, arm_active, action, action_hash, base_dir, executor, pending):
+        file_name = get_file_name(action)
+        start_frame = round(action.frame_start)
+        end_frame = round(action.frame_end)
+
+        arm_active.animation_data.action = action
+        if not load_pending_action(self, arm_active, action, self.import_cache):
+            return False
+
+        if action.pxd_root:
+            self.bool_root_motion = True
+        else:
+            self.bool_root_motion = False
+
+        if action.pxd_additive:
+            self.bool_additive = True
+        else:
+            self.bool_additive = False
+
+        if action.pxd_compress:
+            self.bool_compress = True
+        else:
+            self.bool_compress = False
+
+        action_path = f"{base_dir}\\{file_name}"
+        frame_rate = action.pxd_fps
+        export_data = sample_export_data(self,
+                                         arm_active,
+                                         action,
+                                         start_frame,
+                                         end_frame,
+                                         frame_rate,
+                                         self.get_shared_samples(arm_active, action, start_frame, end_frame),
+                                         )
+        if self.bool_dedup:
+            clip_hash = export_data.get_hash()
+            self.clip_groups.setdefault(clip_hash, []).append(action.name)
+            if clip_hash in self.unique_clips:
+                original_data, original_future = self.unique_clips[clip_hash]
+                future = executor.submit(write_duplicate, action_path, export_data, original_data, original_future)
+            else:
+                future = executor.submit(write_export_data, action_path, export_data)
+                self.unique_clips[clip_hash] = (export_data, future)
+        else:
+            future = executor.submit(write_export_data, action_path, export_data)
+        pending.append((action.name, file_name, action_hash, future, export_data.timer))
+        return True
@@ -0,0 +1,31 @@
+"""
+Entry point of the background Blender processes started by distributed batch export
+blender --background <saved copy>.blend --python batch_worker.py -- <job file>
+
+The job file lists the actions this worker exports, the settings to export them with and where to write results
+Not imported by the addon itself
+"""
+
+
+import bpy
+import addon_utils
+import json
+import sys
+
+
+def main():
+    job_path = sys.argv[sys.argv.index("--") + 1]
+    with open(job_path, "r", encoding='utf-8') as file:
+        job = json.load(file)
+
+    # The addon may not be enabled in this Blender's preferences
+    is_default, is_loaded = addon_utils.check(job["package"])
+    if not is_loaded:
+        addon_utils.enable(job["package"], default_set=False)
+
+    arm_active = bpy.data.objects[job["armature"]]
+    bpy.context.view_layer.objects.active = arm_active
+    bpy.ops.export_anim.frontiers_anim_batch(filepath=job["filepath"], worker_job=job_path, **job["settings"])
+
+
+main()
@@ -1,5 +1,33 @@
 import bpy
+import json
+import os
+import threading
 import time
+from contextlib import contextmanager
+
+# Redrawing the status line is slow on some consoles, so it's rewritten at most this often
+STATUS_INTERVAL = 0.1
+
+
+# Phase timings of one file, filled in by whichever thread does the work and handed to BatchProgress.add_timings.
+# Phases used so far: read, cache, decompress, convert, keyframe, sample, compress, encode, write
+class PhaseTimer:
+    def __init__(self):
+        self.spans = []  # (phase, start, end, thread id), times from time.perf_counter
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, start, time.perf_counter(), threading.get_ident()))
+
+    def get_totals(self):
+        totals = {}
+        for name, start, end, thread_id in self.spans:
+            totals[name] = totals.get(name, 0.0) + end - start
+        return totals
 
 
 # Manage console output and status for better visibility on import/export progress during UI freeze
@@ -15,6 +43,9 @@ class BatchProgress:
         else:
             self.method = None
         self.start_time = time.time()
+        self.start_counter = time.perf_counter()
+        self.last_status = 0.0
+        self.timings = []  # (file name, PhaseTimer)
         self.self_pass = self_pass
         self.item_num = 0
         self.item_name = str()
@@ -27,12 +58,21 @@ class BatchProgress:
     def update_frame_count(self, num_frames):
         self.num_frames = num_frames
 
+    def add_timings(self, name, timer):
+        if timer.spans:
+            self.timings.append((name, timer))
+
     def resume(self, frame_num=0, name=str(), item_num=0):
         if item_num:
             self.item_num = item_num
         if name:
             self.item_name = name
 
+        now = time.perf_counter()
+        if now - self.last_status < STATUS_INTERVAL:
+            return
+        self.last_status = now
+
         if self.method == 'IMPORT':
             status = f"{self.item_num + 1} / {self.num_files}\t{self.item_name}\t{frame_num + 1} / {self.num_frames}"
         elif self.method == 'EXPORT':
@@ -51,8 +91,61 @@ class BatchProgress:
         elif self.method == 'EXPORT':
             self.self_pass.report({'WARNING'}, f"{self.item_name} export was aborted due to errors.")
 
-    def finish(self):
-        if self.method == 'IMPORT':
+    # Seconds spent in each phase over all files, slowest phase first
+    def get_phase_totals(self):
+        totals = {}
+        for name, timer in self.timings:
+            for phase, seconds in timer.get_totals().items():
+                totals[phase] = totals.get(phase, 0.0) + seconds
+        return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+    def print_timings(self):
+        totals = self.get_phase_totals()
+        if not totals:
+            return
+        # Phases on worker threads overlap, so these can add up to more than the elapsed time
+        print("Time per phase: " + ", ".join(f"{phase} {round(seconds, 2)}s" for phase, seconds in totals.items()))
+        file_totals = [(sum(timer.get_totals().values()), name) for name, timer in self.timings]
+        for seconds, name in sorted(file_totals, reverse=True)[:5]:
+            print(f"\t{round(seconds, 2)}s\t{name}")
+
+    # Chrome trace event file, opens in chrome://tracing or ui.perfetto.dev with one row per thread
+    def write_trace(self, filepath):
+        pid = os.getpid()
+        events = []
+        for name, timer in self.timings:
+            for phase, start, end, thread_id in timer.spans:
+                events.append({"name": phase,
+                               "cat": self.method.lower(),
+                               "ph": "X",
+                               "ts": round((start - self.start_counter) * 1e6, 1),
+                               "dur": round((end - start) * 1e6, 1),
+                               "pid": pid,
+                               "tid": thread_id,
+                               "args": {"file": name},
+                               })
+        trace = {"traceEvents": events,
+                 "displayTimeUnit": "ms",
+                 "otherData": {"phase_totals": self.get_phase_totals(),
+                               "elapsed": time.perf_counter() - self.start_counter,
+                               },
+                 }
+        try:
+            with open(filepath, "w", encoding='utf-8') as file:
+                json.dump(trace, file)
+        except OSError as error:
+            self.self_pass.report({'WARNING'}, f"Couldn't write timing trace: {error}")
+            return
+        self.self_pass.report({'INFO'}, f"Timing trace written to {filepath}")
+
+    # num_cancelled is the number of animations imported before an import was cancelled, None if it wasn't
+    def finish(self, trace_path=None, num_cancelled=None):
+        if self.method == 'IMPORT' and num_cancelled is not None:
+            time_elapsed = time.time() - self.start_time
+            print(' ' * self.status_len, end=f"\rCancelled after importing {num_cancelled} of {self.num_files} "
+                                              f"animations in {round(time_elapsed, 2)} seconds.\n")
+
+        elif self.method == 'IMPORT':
             if self.error_list:
                 self.self_pass.report({'INFO'}, "Some animations were skipped due to errors. Please see console for list of skipped animations.")
                 for anim in self.error_list:
@@ -74,3 +167,7 @@ class BatchProgress:
                 self.self_pass.report({'INFO'}, "All animations exported successfully.")
 
             print(' ' * self.status_len, end=f"\rFinished exporting {self.num_files - len(self.error_list)} animations.\n")
+
+        self.print_timings()
+        if trace_path:
+            self.write_trace(trace_path)
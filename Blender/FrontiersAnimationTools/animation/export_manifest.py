@@ -0,0 +1,147 @@
+"""
+Manifest of batch exported animations, kept next to the exported files
+Each entry records a hash of everything the exported file depends on, so unchanged actions can be skipped
+"""
+
+
+import bpy
+import hashlib
+import json
+import os
+import numpy as np
+from .anim_import import TRANSFORM_CHANNELS
+
+MANIFEST_NAME = "frontiers_export_manifest.json"
+# Bump whenever exported files change for the same input, old entries then simply stop matching
+MANIFEST_VERSION = 2
+
+KEYFRAME_PROPS = (('co', 2, np.float32),
+                  ('handle_left', 2, np.float32),
+                  ('handle_right', 2, np.float32),
+                  ('interpolation', 1, np.int32),
+                  ('easing', 1, np.int32),
+                  )
+# Modifier properties that only change how the modifier is drawn
+MODIFIER_UI_PROPS = {'rna_type', 'show_expanded', 'active'}
+
+
+# Every setting of an F-Curve modifier, including nested collections like envelope control points
+def get_rna_values(struct):
+    values = []
+    for prop in struct.bl_rna.properties:
+        if prop.identifier in MODIFIER_UI_PROPS or prop.type == 'POINTER':
+            continue
+        value = getattr(struct, prop.identifier)
+        if prop.type == 'COLLECTION':
+            value = [get_rna_values(item) for item in value]
+        elif isinstance(value, set):
+            value = sorted(value)
+        elif getattr(prop, 'is_array', False):
+            value = list(value)
+        values.append((prop.identifier, value))
+    return values
+
+
+# Transform channels without a playing F-Curve keep the pose's current value, which is sampled as is
+def get_unkeyed_values(action, arm_active, bool_root_motion, bool_bones=True):
+    keyed = set()
+    for fcurve in action.fcurves:
+        if not fcurve.mute and not (fcurve.group and fcurve.group.mute):
+            keyed.add((fcurve.data_path, fcurve.array_index))
+
+    targets = [(f"{pbone.path_from_id()}.", pbone) for pbone in arm_active.pose.bones] if bool_bones else []
+    if bool_root_motion:
+        targets.append(("", arm_active))
+    values = []
+    for data_path_prefix, target in targets:
+        for data_path, channel_count in TRANSFORM_CHANNELS:
+            current = getattr(target, data_path)
+            for index in range(channel_count):
+                if (f"{data_path_prefix}{data_path}", index) not in keyed:
+                    values.append(current[index])
+    return np.array(values, dtype=np.float32)
+
+
+# Hash of the action's keys, its export settings and the armature it's exported with.
+# The action has to be assigned to arm_active, so unkeyed channels hold the values they'll be sampled with.
+def hash_action(action, arm_active, binding_hash, start_frame, end_frame, settings):
+    digest = hashlib.sha256()
+    header = [MANIFEST_VERSION, binding_hash, start_frame, end_frame, action.pxd_fps, action.pxd_root,
+              action.pxd_additive, settings]
+    digest.update(json.dumps(header).encode('utf-8'))
+
+    update_keys_digest(digest, action)
+    # Decoding a register-only action keys every bone, but the object is left alone if the file has no root motion
+    unkeyed = get_unkeyed_values(action, arm_active, action.pxd_root, bool_bones=not action.pxd_pending)
+    digest.update(unkeyed.tobytes())
+    return digest.hexdigest()
+
+
+# Hash of the action's keys alone, actions with the same hash evaluate identically on the same armature
+def hash_action_keys(action):
+    digest = hashlib.sha256()
+    update_keys_digest(digest, action)
+    return digest.hexdigest()
+
+
+def update_keys_digest(digest, action):
+    # Register-only actions are fully defined by their source file, no need to decode them just to hash them
+    if action.pxd_pending:
+        digest.update(json.dumps([action.pxd_yx_skel, action.pxd_pad_loop]).encode('utf-8'))
+        with open(bpy.path.abspath(action.pxd_source), "rb") as file:
+            digest.update(file.read())
+        return
+
+    for fcurve in sorted(action.fcurves, key=lambda fcurve: (fcurve.data_path, fcurve.array_index)):
+        modifiers = [(modifier.type, get_rna_values(modifier)) for modifier in fcurve.modifiers]
+        digest.update(json.dumps([fcurve.data_path, fcurve.array_index, fcurve.mute, fcurve.extrapolation,
+                                  modifiers]).encode('utf-8'))
+        points = fcurve.keyframe_points
+        for prop, width, dtype in KEYFRAME_PROPS:
+            values = np.empty(len(points) * width, dtype=dtype)
+            points.foreach_get(prop, values)
+            digest.update(values.tobytes())
+
+
+class ExportManifest:
+    def __init__(self, directory):
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self.directory = directory
+        self.files = {}
+        try:
+            with open(self.path, "r", encoding='utf-8') as file:
+                manifest = json.load(file)
+            if manifest.get("version") == MANIFEST_VERSION:
+                self.files = manifest["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    # Up to date if the hash matches and the file is still the one that was written
+    def is_current(self, file_name, action_hash):
+        entry = self.files.get(file_name)
+        if not entry or entry["hash"] != action_hash:
+            return False
+        try:
+            return os.path.getsize(os.path.join(self.directory, file_name)) == entry["size"]
+        except OSError:
+            return False
+
+    def update(self, file_name, action_hash):
+        try:
+            size = os.path.getsize(os.path.join(self.directory, file_name))
+        except OSError:
+            return
+        self.files[file_name] = {"hash": action_hash, "size": size}
+
+    def remove(self, file_name):
+        self.files.pop(file_name, None)
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding='utf-8') as file:
+                json.dump({"version": MANIFEST_VERSION, "files": self.files}, file, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
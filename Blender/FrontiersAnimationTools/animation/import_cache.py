@@ -0,0 +1,87 @@
+"""
+On-disk cache of converted animation imports
+Entries are keyed by the PXD file contents, the armature binding and the import options, so a hit can skip
+ACL decompression and track conversion and go straight to F-Curve creation
+
+No bpy calls in here so it can run on worker threads
+"""
+
+
+import hashlib
+import os
+import threading
+import zipfile
+import numpy as np
+
+# Bump whenever the stored arrays change meaning, old entries then simply stop matching
+CACHE_VERSION = 1
+
+
+class PoseCache:
+    def __init__(self, directory, size_limit):
+        self.directory = directory
+        self.size_limit = size_limit  # Bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    # Loop padding is applied after loading, so it isn't part of the key
+    @staticmethod
+    def make_key(file_bytes, binding_hash, bool_yx_skel, bool_root_motion):
+        file_hash = hashlib.sha256(file_bytes).hexdigest()
+        key = f"{CACHE_VERSION}|{file_hash}|{binding_hash}|{int(bool_yx_skel)}|{int(bool_root_motion)}"
+        return hashlib.sha256(key.encode('ascii')).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    # Returns (basis, root) or None on a miss, root is None if the clip had no root motion
+    def load(self, key):
+        path = self.get_path(key)
+        try:
+            with np.load(path) as entry:
+                basis = entry['basis']
+                root = entry['root'] if 'root' in entry.files else None
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+
+        # Mark as recently used for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return basis, root
+
+    def store(self, key, basis, root):
+        arrays = {'basis': basis}
+        if root is not None:
+            arrays['root'] = root
+
+        # Write under a unique name first so other threads/instances never read a partial entry
+        path = self.get_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as file:
+                np.savez_compressed(file, **arrays)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # Remove least recently used entries until the cache fits in its size limit
+    def evict(self):
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".npz"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        entries.sort()
+        for mtime, size, path in entries:
+            if total_size <= self.size_limit:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+            except OSError:
+                pass
@@ -0,0 +1,179 @@
+"""
+Assembles PXD animation files from compressed ACL buffers
+No bpy calls in here so headless tools can write PXDs too
+
+Compressed file layout, see bina.py for the container:
+0x00    BINA header
+0x10    DATA chunk header, offsets in the DATA chunk are relative to 0x40
+0x40    NAXP animation header
+0x80    Main ACL buffer
+        Root ACL buffer (optional), 0x10 aligned
+        Offset table
+
+Uncompressed files replace the ACL buffers with track tables, see get_uncompressed_frame_table in anim_import.py
+"""
+
+
+import struct
+import numpy as np
+from ..bina import DATA_OFFSET, pack_bina_headers, encode_offset_table
+
+NAXP_HEADER = struct.Struct('<4siBB6xiifiiiqqq')
+TRACK_ENTRY = struct.Struct('<9Q')  # Location, rotation, scale: key count, frame table offset, data table offset
+NAXP_SIZE = 0x40
+KEY_TOLERANCE = 0.0001
+
+
+# Alignment padding as written by the original exporter, a whole block is added if the size is already aligned
+def get_padding(size, alignment):
+    return alignment - size % alignment
+
+
+# Returns the file contents as a single bytearray
+def build_animation(main_buffer, root_buffer, duration, frame_count, track_count, is_additive=False, is_compressed=True):
+    main_size = len(main_buffer)
+    root_size = len(root_buffer)
+
+    main_offset = DATA_OFFSET + NAXP_SIZE
+    if root_size:
+        root_offset = main_offset + main_size + get_padding(main_size, 0x10)
+        offset_table_offset = root_offset + root_size + get_padding(root_size, 4)
+        offset_table = encode_offset_table([DATA_OFFSET + 0x10, DATA_OFFSET + 0x28, DATA_OFFSET + 0x30])
+    else:
+        root_offset = None
+        offset_table_offset = main_offset + main_size + get_padding(main_size, 4)
+        offset_table = encode_offset_table([DATA_OFFSET + 0x10, DATA_OFFSET + 0x28])
+    file_size = offset_table_offset + len(offset_table)
+
+    data = bytearray(file_size)
+    pack_headers(data, offset_table_offset, len(offset_table), duration, frame_count, track_count, is_additive,
+                 is_compressed, main_offset, root_offset)
+    data[main_offset:main_offset + main_size] = main_buffer
+    if root_offset:
+        data[root_offset:root_offset + root_size] = root_buffer
+    data[offset_table_offset:] = offset_table
+    return data
+
+
+# BINA, DATA and NAXP headers, the offset table directly follows the data with an empty string table
+def pack_headers(data, offset_table_offset, offset_table_size, duration, frame_count, track_count, is_additive,
+                 is_compressed, main_offset, root_offset):
+    pack_bina_headers(data, offset_table_offset, 0, offset_table_size)
+    NAXP_HEADER.pack_into(data, DATA_OFFSET,
+                          b'NAXP', 0x200,
+                          1 if is_additive else 0,
+                          8 if is_compressed else 0,
+                          0x18, 0,
+                          duration, frame_count, track_count, 0,
+                          main_offset - DATA_OFFSET,
+                          root_offset - DATA_OFFSET if root_offset else 0,
+                          0)
+
+
+# Frames that can't be rebuilt by linear interpolation between the keys around them, values[frame][track][component].
+# Returns keep[frame][track], first and last frames are always kept.
+def get_sparse_keys(values, tolerance=KEY_TOLERANCE):
+    frame_count = values.shape[0]
+    keep = np.zeros(values.shape[:2], dtype=bool)
+    keep[0] = True
+    keep[-1] = True
+    if frame_count > 2:
+        # Keys sitting on the line between their neighbours are candidates for removal
+        midpoint = (values[:-2] + values[2:]) * 0.5
+        keep[1:-1] = np.any(np.abs(values[1:-1] - midpoint) > tolerance, axis=-1)
+
+    # Small errors add up over long runs of removed keys, keep adding back keys wherever the rebuilt curve drifts
+    frames = np.arange(frame_count)[:, None]
+    while True:
+        previous_key = np.maximum.accumulate(np.where(keep, frames, 0), axis=0)
+        next_key = np.flip(np.minimum.accumulate(np.flip(np.where(keep, frames, frame_count - 1), axis=0), axis=0),
+                           axis=0)
+        span = np.maximum(next_key - previous_key, 1)
+        factor = ((frames - previous_key) / span)[..., None]
+        previous_values = np.take_along_axis(values, previous_key[..., None], axis=0)
+        next_values = np.take_along_axis(values, next_key[..., None], axis=0)
+        rebuilt = previous_values + (next_values - previous_values) * factor
+
+        drift = np.any(np.abs(rebuilt - values) > tolerance, axis=-1) & ~keep
+        if not drift.any():
+            return keep
+        keep |= drift
+
+
+# Sparse key tables of one track chunk, tracks[frame][track] laid out like the decompressed buffer struct.
+# Returns the chunk bytes and the offsets of the pointers in it, relative to the chunk's start.
+def build_track_chunk(tracks, chunk_offset, tolerance=KEY_TOLERANCE):
+    frame_count, track_count = tracks.shape[:2]
+    rot = tracks[..., 0:4].astype(np.float64)
+    # Linear interpolation between keys needs the short path between consecutive rotations
+    flip = np.einsum('...i,...i->...', rot[1:], rot[:-1]) < 0.0
+    sign = np.ones(rot.shape[:2])
+    sign[1:] = np.where(np.logical_xor.accumulate(flip, axis=0), -1.0, 1.0)
+    rot *= sign[..., None]
+
+    # Location, rotation, scale, each stored as 0x10 wide keys
+    channels = (tracks[..., 4:7], rot, tracks[..., 8:11])
+    masks = [get_sparse_keys(channel.astype(np.float64), tolerance) for channel in channels]
+
+    table_size = TRACK_ENTRY.size * track_count
+    size = table_size + -table_size % 0x10
+    layout = []
+    for track in range(track_count):
+        for channel, mask in zip(channels, masks):
+            key_frames = np.flatnonzero(mask[:, track])
+            frame_table_offset = size
+            size += len(key_frames) * 2
+            size += -size % 0x10
+            data_table_offset = size
+            size += len(key_frames) * 0x10
+            layout.append((key_frames, frame_table_offset, data_table_offset))
+
+    chunk = bytearray(size)
+    pointers = []
+    for track in range(track_count):
+        entry = []
+        for c, channel in enumerate(channels):
+            key_frames, frame_table_offset, data_table_offset = layout[track * 3 + c]
+            chunk[frame_table_offset:frame_table_offset + len(key_frames) * 2] = key_frames.astype('<u2').tobytes()
+            keys = np.zeros((len(key_frames), 4), dtype='<f4')
+            keys[:, :channel.shape[-1]] = channel[key_frames, track]
+            chunk[data_table_offset:data_table_offset + keys.nbytes] = keys.tobytes()
+            entry += [len(key_frames),
+                      chunk_offset + frame_table_offset - DATA_OFFSET,
+                      chunk_offset + data_table_offset - DATA_OFFSET]
+            # Frame and data table offsets of this channel
+            entry_offset = TRACK_ENTRY.size * track + 0x18 * c
+            pointers += [entry_offset + 0x8, entry_offset + 0x10]
+        TRACK_ENTRY.pack_into(chunk, TRACK_ENTRY.size * track, *entry)
+    return chunk, pointers
+
+
+# Uncompressed animation with only the keys needed to rebuild every channel within tolerance.
+# main_tracks[frame][track] and root_tracks[frame][0] are laid out like the decompressed buffer struct.
+def build_uncompressed_animation(main_tracks, root_tracks, duration, is_additive=False, tolerance=KEY_TOLERANCE):
+    frame_count, track_count = main_tracks.shape[:2]
+    if frame_count > 0x10000:
+        raise ValueError(f"Uncompressed animations can't be longer than {0x10000} frames")
+
+    main_offset = DATA_OFFSET + NAXP_SIZE
+    main_chunk, main_pointers = build_track_chunk(main_tracks, main_offset, tolerance)
+    pointers = [DATA_OFFSET + 0x10, DATA_OFFSET + 0x28] + [main_offset + pointer for pointer in main_pointers]
+
+    root_offset = None
+    root_chunk = bytes()
+    if root_tracks is not None:
+        root_offset = main_offset + len(main_chunk)
+        root_chunk, root_pointers = build_track_chunk(root_tracks, root_offset, tolerance)
+        pointers += [DATA_OFFSET + 0x30] + [root_offset + pointer for pointer in root_pointers]
+
+    offset_table_offset = main_offset + len(main_chunk) + len(root_chunk)
+    offset_table = encode_offset_table(pointers)
+
+    data = bytearray(offset_table_offset + len(offset_table))
+    pack_headers(data, offset_table_offset, len(offset_table), duration, frame_count, track_count, is_additive,
+                 False, main_offset, root_offset)
+    data[main_offset:main_offset + len(main_chunk)] = main_chunk
+    if root_offset:
+        data[root_offset:root_offset + len(root_chunk)] = root_chunk
+    data[offset_table_offset:] = offset_table
+    return data
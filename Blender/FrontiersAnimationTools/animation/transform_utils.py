@@ -0,0 +1,272 @@
+"""
+Vectorized transform math for converting between PXD tracks and Blender pose channels
+No bpy calls in here so it can run on worker threads
+
+Quaternions are stored as wxyz to match mathutils
+"""
+
+
+import hashlib
+import numpy as np
+
+RMS = 1 / np.sqrt(2)
+
+
+def quat_multiply(a, b):
+    aw, ax, ay, az = np.moveaxis(a, -1, 0)
+    bw, bx, by, bz = np.moveaxis(b, -1, 0)
+    return np.stack((aw * bw - ax * bx - ay * by - az * bz,
+                     aw * bx + ax * bw + ay * bz - az * by,
+                     aw * by - ax * bz + ay * bw + az * bx,
+                     aw * bz + ax * by - ay * bx + az * bw), axis=-1)
+
+
+def quat_conjugate(q):
+    return q * np.array((1.0, -1.0, -1.0, -1.0), dtype=q.dtype)
+
+
+def quat_rotate(q, v):
+    # v + 2w(u x v) + 2u x (u x v)
+    w = q[..., :1]
+    u = q[..., 1:]
+    t = 2.0 * np.cross(u, v)
+    return v + w * t + np.cross(u, t)
+
+
+def quat_normalize(q):
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+# Start with w >= 0 like mathutils, then keep consecutive frames in the same hemisphere
+# so linear keys interpolate the short way around
+def quat_make_continuous(q, axis=0):
+    q = np.moveaxis(q, axis, 0)
+    q = np.where(q[:1, ..., :1] < 0.0, -q, q)
+    flip = np.einsum('...i,...i->...', q[1:], q[:-1]) < 0.0
+    sign = np.ones(q.shape[:-1], dtype=q.dtype)
+    sign[1:] = np.where(np.logical_xor.accumulate(flip, axis=0), -1.0, 1.0)
+    return np.moveaxis(q * sign[..., None], 0, axis)
+
+
+# Flip a block of frames so its first frame is in the same hemisphere as the frame before it,
+# keeps separately converted windows continuous with each other
+def quat_match_hemisphere(q, previous):
+    flip = np.einsum('...i,...i->...', q[0], previous) < 0.0
+    return np.where(flip[..., None], -q, q)
+
+
+# Rest data of an armature needed to convert tracks to pose channels
+class RigBinding:
+    def __init__(self, names, parents, rest_matrices):
+        # names[bone index], parents[bone index] (-1 for roots), rest_matrices[bone index] = Bone.matrix_local
+        self.names = list(names)
+        self.parents = np.asarray(parents, dtype=np.int32)
+        self.bone_count = len(self.names)
+
+        # Parents must be processed before children for scale accumulation
+        self.order = []
+        visited = np.zeros(self.bone_count, dtype=bool)
+        for i in range(self.bone_count):
+            chain = []
+            bone = i
+            while bone >= 0 and not visited[bone]:
+                chain.append(bone)
+                visited[bone] = True
+                bone = self.parents[bone]
+            self.order.extend(reversed(chain))
+        self.order = np.array(self.order, dtype=np.int32)
+
+        # Rest offset of each bone relative to its parent, both in armature space
+        rest_matrices = np.asarray(rest_matrices, dtype=np.float64).reshape(-1, 4, 4)
+        offsets = rest_matrices.copy()
+        has_parent = self.parents >= 0
+        offsets[has_parent] = np.linalg.inv(rest_matrices[self.parents[has_parent]]) @ rest_matrices[has_parent]
+        self.offset_loc = offsets[:, :3, 3]
+        self.offset_rot = matrix_to_quat(offsets[:, :3, :3])
+
+        self.is_root = ~has_parent
+
+        # Identifies the rig for caching converted animations
+        rig_hash = hashlib.sha256()
+        rig_hash.update("\0".join(self.names).encode('utf-8'))
+        rig_hash.update(self.parents.tobytes())
+        rig_hash.update(rest_matrices.astype(np.float32).tobytes())
+        self.hash = rig_hash.hexdigest()
+
+
+def matrix_to_quat(matrices):
+    # Shepperd's method, canonicalized to w >= 0 like mathutils
+    m = np.asarray(matrices, dtype=np.float64)
+    m00, m11, m22 = m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]
+    candidates = np.stack((1.0 + m00 + m11 + m22,
+                           1.0 + m00 - m11 - m22,
+                           1.0 - m00 + m11 - m22,
+                           1.0 - m00 - m11 + m22), axis=-1)
+    choice = np.argmax(candidates, axis=-1)
+    s = 2.0 * np.sqrt(np.maximum(np.take_along_axis(candidates, choice[..., None], axis=-1)[..., 0], 1e-12))
+
+    q = np.empty(m.shape[:-2] + (4,), dtype=np.float64)
+    d21 = m[..., 2, 1] - m[..., 1, 2]
+    d02 = m[..., 0, 2] - m[..., 2, 0]
+    d10 = m[..., 1, 0] - m[..., 0, 1]
+    s01 = m[..., 0, 1] + m[..., 1, 0]
+    s02 = m[..., 0, 2] + m[..., 2, 0]
+    s12 = m[..., 1, 2] + m[..., 2, 1]
+
+    table = (
+        (0.25 * s, d21 / s, d02 / s, d10 / s),
+        (d21 / s, 0.25 * s, s01 / s, s02 / s),
+        (d02 / s, s01 / s, 0.25 * s, s12 / s),
+        (d10 / s, s02 / s, s12 / s, 0.25 * s),
+    )
+    for c, row in enumerate(table):
+        mask = choice == c
+        for i in range(4):
+            q[..., i][mask] = row[i][mask]
+
+    q[q[..., 0] < 0.0] *= -1.0
+    return q
+
+
+def quat_to_matrix(q):
+    w, x, y, z = np.moveaxis(quat_normalize(np.asarray(q, dtype=np.float64)), -1, 0)
+    return np.stack((np.stack((1.0 - 2.0 * (y * y + z * z), 2.0 * (x * y - w * z), 2.0 * (x * z + w * y)), axis=-1),
+                     np.stack((2.0 * (x * y + w * z), 1.0 - 2.0 * (x * x + z * z), 2.0 * (y * z - w * x)), axis=-1),
+                     np.stack((2.0 * (x * z - w * y), 2.0 * (y * z + w * x), 1.0 - 2.0 * (x * x + y * y)), axis=-1)),
+                    axis=-2)
+
+
+# Number of ancestors of each bone, parents[bone] is -1 for roots
+def get_bone_depths(parents):
+    depths = np.zeros(len(parents), dtype=np.int32)
+    ancestors = np.asarray(parents).copy()
+    while np.any(ancestors > -1):
+        has_ancestor = ancestors > -1
+        depths[has_ancestor] += 1
+        ancestors[has_ancestor] = parents[ancestors[has_ancestor]]
+    return depths
+
+
+# Armature space rest matrices from parent-relative rotations (wxyz) and locations, one hierarchy level at a time.
+# Roots are placed relative to root_matrix, the same as applying the transforms as a pose to bones with that rest.
+def local_to_rest(rot, loc, parents, root_matrix=np.eye(4)):
+    local = np.zeros((len(parents), 4, 4))
+    local[:, :3, :3] = quat_to_matrix(rot)
+    local[:, :3, 3] = loc
+    local[:, 3, 3] = 1.0
+
+    depths = get_bone_depths(parents)
+    rest = np.empty_like(local)
+    roots = depths == 0
+    rest[roots] = root_matrix @ local[roots]
+    for depth in range(1, depths.max(initial=0) + 1):
+        bones = np.flatnonzero(depths == depth)
+        rest[bones] = rest[parents[bones]] @ local[bones]
+    return rest
+
+
+# Vectorized version of the export's per-bone decompose and inverted parent matrix products
+def pose_to_local(pose_matrices, parents):
+    # pose_matrices[..., bone] = row-major PoseBone.matrix, returns parent-relative rotations (wxyz) and locations
+    # with scale removed from both bones, the same as inverting the parent's unscaled matrix
+    m = np.asarray(pose_matrices, dtype=np.float64)
+    loc = m[..., :3, 3]
+    rot = m[..., :3, :3] / np.linalg.norm(m[..., :3, :3], axis=-2, keepdims=True)
+    # Like Matrix.decompose, negative scale is taken out of the rotation
+    rot[np.linalg.det(rot) < 0.0] *= -1.0
+
+    has_parent = parents >= 0
+    parent_index = np.where(has_parent, parents, 0)
+    parent_rot_t = np.where(has_parent[:, None, None], np.swapaxes(rot[..., parent_index, :, :], -1, -2), np.eye(3))
+    parent_loc = np.where(has_parent[:, None], loc[..., parent_index, :], 0.0)
+
+    local_rot = parent_rot_t @ rot
+    local_loc = (parent_rot_t @ (loc - parent_loc)[..., None])[..., 0]
+    return matrix_to_quat(local_rot), local_loc
+
+
+# Split decoded ACL samples into Blender-space local rotations, locations and scales
+def tracks_to_local(tracks, binding, bool_yx_skel):
+    # tracks[frame][track] = quat xyzw (4), location xyz (3), bone length (1), scale xyz (3), 1.0 (1)
+    frame_count = tracks.shape[0]
+    track_count = min(tracks.shape[1], binding.bone_count)
+    tracks = tracks[:, :track_count].astype(np.float64)
+
+    rot = np.zeros((frame_count, binding.bone_count, 4))
+    rot[..., 0] = 1.0
+    loc = np.zeros((frame_count, binding.bone_count, 3))
+    scale = np.ones((frame_count, binding.bone_count, 3))
+
+    if bool_yx_skel:
+        rot[:, :track_count] = tracks[..., (3, 2, 0, 1)]
+        loc[:, :track_count] = tracks[..., (6, 4, 5)]
+        track_scale = tracks[..., (10, 8, 9)]
+        # Identity matrix to swap XZ to YX
+        roots = np.flatnonzero(binding.is_root[:track_count])
+        rot[:, roots] = quat_multiply(rot[:, roots], np.array((0.5, -0.5, -0.5, -0.5)))
+    else:
+        rot[:, :track_count] = tracks[..., (3, 0, 1, 2)]
+        loc[:, :track_count] = tracks[..., 4:7]
+        track_scale = tracks[..., 8:11]
+
+    # Zero scale means the track carries no scale
+    track_scale[np.all(track_scale == 0.0, axis=-1)] = 1.0
+    scale[:, :track_count] = track_scale
+    return rot, loc, scale
+
+
+# Scale accumulated down the hierarchy up to each bone's parent, scale[frame][bone] = local scale
+def get_parent_scale(scale, binding):
+    parent_scale = np.ones_like(scale)
+    accumulated_scale = scale.copy()
+    for i in binding.order:
+        parent = binding.parents[i]
+        if parent >= 0:
+            parent_scale[:, i] = accumulated_scale[:, parent]
+            accumulated_scale[:, i] *= accumulated_scale[:, parent]
+    return parent_scale
+
+
+# Vectorized version of get_matrix_map_global + Bone.convert_local_to_pose(invert=True)
+def local_to_basis(rot, loc, scale, binding):
+    # Track locations are unaffected by parent scale, while Blender's aligned scale inheritance scales child
+    # locations by the accumulated parent scale. With parent world matrix P = U @ S (U unscaled), the pose
+    # channels reduce to:
+    #   rotation = offset_rot^-1 @ track rotation
+    #   location = offset_rot^-1 @ (track location / accumulated parent scale - offset_loc)
+    #   scale    = track scale
+    parent_scale = get_parent_scale(scale, binding)
+
+    offset_rot_inv = quat_conjugate(binding.offset_rot)
+    basis = np.empty(rot.shape[:2] + (10,), dtype=np.float32)
+    basis[..., 0:3] = quat_rotate(offset_rot_inv, loc / parent_scale - binding.offset_loc)
+    basis[..., 3:7] = quat_make_continuous(quat_normalize(quat_multiply(offset_rot_inv, rot)))
+    basis[..., 7:10] = scale
+    return basis
+
+
+# Root motion track to armature object transforms, reoriented for Z-up space
+def root_tracks_to_transforms(tracks):
+    tracks = tracks[:, 0].astype(np.float64)
+    transforms = np.empty((tracks.shape[0], 10), dtype=np.float32)
+    transforms[:, 0] = tracks[:, 4]
+    transforms[:, 1] = -tracks[:, 6]
+    transforms[:, 2] = tracks[:, 5]
+    rot = quat_multiply(np.array((RMS, RMS, 0.0, 0.0)), quat_normalize(tracks[:, (3, 0, 1, 2)]))
+    transforms[:, 3:7] = quat_make_continuous(rot)
+    scale = tracks[:, 8:11].copy()
+    scale[np.all(scale == 0.0, axis=-1)] = 1.0
+    transforms[:, 7:10] = scale
+    return transforms
+
+
+# Inverse of local_to_basis, gives the same transforms as pose_to_local on evaluated poses straight from pose channels
+def basis_to_local(basis, binding):
+    loc_basis = basis[..., 0:3].astype(np.float64)
+    scale = basis[..., 7:10].astype(np.float64)
+    parent_scale = get_parent_scale(scale, binding)
+
+    rot = quat_multiply(binding.offset_rot, quat_normalize(basis[..., 3:7].astype(np.float64)))
+    rot[rot[..., 0] < 0.0] *= -1.0
+    loc = parent_scale * (binding.offset_loc + quat_rotate(binding.offset_rot, loc_basis))
+    return rot, loc, scale
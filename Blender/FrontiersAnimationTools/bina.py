@@ -0,0 +1,59 @@
+"""
+Shared pieces of the BINA container used by PXD animation and skeleton files
+No bpy calls in here so headless tools can write PXDs too
+
+0x00    BINA header
+0x10    DATA chunk header, followed by 0x18 bytes of additional header
+0x40    Chunk data, every offset stored in it is relative to 0x40
+        String table
+        Offset table, the position of every offset stored in the chunk data
+"""
+
+
+import os
+import struct
+
+BINA_HEADER = struct.Struct('<8sii')  # magic + version, file size, chunk count
+DATA_HEADER = struct.Struct('<4siiiii')  # magic, chunk size, string table offset, string table size, offset table size, additional header size
+DATA_OFFSET = 0x40
+
+
+# BINA and DATA headers of a file with a single DATA chunk, data holds the whole file
+def pack_bina_headers(data, string_table_offset, string_table_size, offset_table_size):
+    file_size = len(data)
+    BINA_HEADER.pack_into(data, 0x0, b'BINA210L', file_size, 1)
+    DATA_HEADER.pack_into(data, 0x10, b'DATA', file_size - 0x10, string_table_offset - DATA_OFFSET,
+                          string_table_size, offset_table_size, 0x18)
+
+
+# Offset table, one entry per offset in the DATA chunk holding the distance from the previous one in 4 byte units.
+# Entries are 1, 2 or 4 bytes big endian, with the top two bits giving the size. Padded to 4 bytes with zeros.
+def encode_offset_table(pointer_offsets):
+    table = bytearray()
+    previous = DATA_OFFSET
+    for pointer in sorted(pointer_offsets):
+        distance = (pointer - previous) >> 2
+        if distance < 0x40:
+            table.append(0x40 | distance)
+        elif distance < 0x4000:
+            table += (0x8000 | distance).to_bytes(2, byteorder='big')
+        elif distance < 0x40000000:
+            table += (0xC0000000 | distance).to_bytes(4, byteorder='big')
+        else:
+            raise ValueError("Offset table entry out of range")
+        previous = pointer
+    table += bytes(-len(table) % 4)
+    return bytes(table)
+
+
+# Write through a temporary file so an interrupted export never leaves a truncated file behind
+def write_file(filepath, data):
+    tmp_path = f"{filepath}.tmp"
+    try:
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, filepath)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
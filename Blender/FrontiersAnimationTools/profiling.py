@@ -0,0 +1,90 @@
+"""
+Opt-in profiling of the import and export operators, for reproducing "this file is slow" reports
+Writes <name>.prof next to the output for snakeviz or pstats, plus <name>_profile.txt with the hottest functions
+and the time spent inside FrontiersAnimDecompress.dll, readable without any tools
+
+cProfile only sees the thread that runs the operator. Work done on worker threads shows up in the native timings
+and in the timing traces written by BatchProgress.
+"""
+
+
+import cProfile
+import functools
+import io
+import os
+import platform
+import pstats
+import time
+import bpy
+from .FrontiersAnimDecompress.process_buffer import get_native_timings, reset_native_timings
+
+SUMMARY_LINES = 40
+
+
+# Profiling shouldn't fail just because the DLL can't be loaded, uncompressed exports don't need it
+def read_native_timings():
+    try:
+        return get_native_timings()
+    except OSError:
+        return None
+
+
+def write_summary(filepath, profiler, elapsed, native_timings):
+    lines = [f"Blender {bpy.app.version_string}, Python {platform.python_version()}, {platform.platform()}",
+             f"{bpy.data.filepath or 'Unsaved file'}",
+             f"Elapsed: {round(elapsed, 3)}s",
+             ""]
+
+    if native_timings is None:
+        lines.append("Native timings: not available, FrontiersAnimDecompress.dll is missing or was built without "
+                     "timing hooks")
+    else:
+        for method in ("compress", "decompress"):
+            total = native_timings[f"{method}_ns"] / 1e9
+            acl = native_timings[f"{method}_acl_ns"] / 1e9
+            lines.append(f"Native {method}: {native_timings[f'{method}_calls']} calls, {round(total, 3)}s "
+                         f"({round(acl, 3)}s in ACL, {round(total - acl, 3)}s converting buffers)")
+    lines.append("")
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.strip_dirs()
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(SUMMARY_LINES)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(SUMMARY_LINES)
+
+    with open(filepath, "w", encoding='utf-8') as file:
+        file.write("\n".join(lines))
+        file.write(stream.getvalue())
+
+
+# Wraps an operator's execute. With the operator's bool_profile enabled, the call is profiled and the results are
+# written to get_directory(operator)/name.prof and name_profile.txt.
+def profiled(name, get_directory):
+    def decorator(execute):
+        @functools.wraps(execute)
+        def wrapper(self, context):
+            if not self.bool_profile:
+                return execute(self, context)
+
+            directory = get_directory(self)
+            prof_path = os.path.join(directory, f"{name}.prof")
+            summary_path = os.path.join(directory, f"{name}_profile.txt")
+
+            try:
+                reset_native_timings()
+            except OSError:
+                pass
+            profiler = cProfile.Profile()
+            start_time = time.perf_counter()
+            try:
+                return profiler.runcall(execute, self, context)
+            finally:
+                elapsed = time.perf_counter() - start_time
+                try:
+                    profiler.dump_stats(prof_path)
+                    write_summary(summary_path, profiler, elapsed, read_native_timings())
+                    self.report({'INFO'}, f"Profile written to {prof_path} and {summary_path}")
+                except OSError as error:
+                    self.report({'WARNING'}, f"Couldn't write profile: {error}")
+        return wrapper
+    return decorator
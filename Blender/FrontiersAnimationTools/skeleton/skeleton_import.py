@@ -2,10 +2,8 @@
 # https://github.com/Turk645/Hedgehog-Engine-2-Mesh-Blender-Importer
 
 import bpy
-import io
 import os
-import struct
-import mathutils
+import numpy as np
 from bpy_extras.io_utils import ImportHelper
 from bpy.props import (BoolProperty,
                        FloatProperty,
@@ -13,6 +11,15 @@ from bpy.props import (BoolProperty,
                        EnumProperty,
                        CollectionProperty
                        )
+from .skeleton_reader import read_skeleton
+from ..animation.transform_utils import local_to_rest
+
+DEFAULT_LENGTH = 0.1
+# Rest matrix of a bone pointing along +X with a -90 degree roll, the base orientation of reoriented bones
+YX_REST_MATRIX = np.array(((0.0, 1.0, 0.0, 0.0),
+                           (0.0, 0.0, 1.0, 0.0),
+                           (1.0, 0.0, 0.0, 0.0),
+                           (0.0, 0.0, 0.0, 1.0)))
 
 
 class HedgehogSkeletonImport(bpy.types.Operator, ImportHelper):
@@ -118,22 +125,37 @@ class HedgehogSkeletonImport(bpy.types.Operator, ImportHelper):
     def execute(self, context):
         bpy.ops.object.select_all(action='DESELECT')
         for file in self.files:
-            skel_file = open(os.path.join(os.path.dirname(self.filepath), file.name), "rb")
-            if not self.skel_check(skel_file):
+            try:
+                skeleton = read_skeleton(os.path.join(os.path.dirname(self.filepath), file.name))
+            except (OSError, ValueError) as error:
+                self.report({'ERROR'}, f"{file.name}: {error}")
                 return {'CANCELLED'}
 
             skel_name = file.name
             for ext in [".skl", ".pxd"]:
                 skel_name = skel_name.replace(ext, "")
 
-            skel_file.seek(0x48)
-            skel_parenting_offset = int.from_bytes(skel_file.read(4), byteorder='little') + 0x40
-            skel_file.seek(4, 1)
-            skel_parenting_count = int.from_bytes(skel_file.read(4), byteorder='little')
-            skel_file.seek(0x68)
-            skel_name_table = int.from_bytes(skel_file.read(4), byteorder='little') + 0x40
-            skel_file.seek(0x88)
-            skel_pos_offset = int.from_bytes(skel_file.read(4), byteorder='little') + 0x40
+            # Swizzled to Blender's wxyz, and from XZ to YX if reorienting
+            if self.use_yx_orientation:
+                rest_matrices = local_to_rest(skeleton.rot[:, (3, 2, 0, 1)], skeleton.loc[:, (2, 0, 1)],
+                                              skeleton.parents, YX_REST_MATRIX)
+            else:
+                rest_matrices = local_to_rest(skeleton.rot[:, (3, 0, 1, 2)], skeleton.loc, skeleton.parents)
+
+            if self.get_bone_lengths:
+                if self.get_bone_lengths_end == "customLength":
+                    end_length = self.get_bone_lengths_custom
+                else:
+                    end_length = self.get_bone_lengths_min
+                lengths = get_bone_lengths(skeleton.parents,
+                                           rest_matrices[:, :3, 3],
+                                           self.get_bone_lengths_min,
+                                           self.get_bone_lengths_max,
+                                           end_length,
+                                           self.get_bone_lengths_end == "prevLength",
+                                           )
+            else:
+                lengths = np.full(skeleton.bone_count, DEFAULT_LENGTH)
 
             armature_data = bpy.data.armatures.new(f"{skel_name}_skeleton")
             armature_obj = bpy.data.objects.new(f"{skel_name}_skeleton", armature_data)
@@ -145,32 +167,13 @@ class HedgehogSkeletonImport(bpy.types.Operator, ImportHelper):
             bpy.ops.object.select_all(action='DESELECT')
             armature_obj.select_set(True)
 
+            # Bones are placed at their final rest transforms in a single edit mode session
             utils_set_mode('EDIT')
 
-            skel_table = []
-            for x in range(skel_parenting_count):
-                skel_file.seek(skel_parenting_offset + x * 0x2)
-                bone_parent = int.from_bytes(skel_file.read(2), byteorder='little', signed=True)
-                skel_file.seek(skel_name_table + x * 0x10)
-                skel_name_offset = int.from_bytes(skel_file.read(4), byteorder='little') + 0x40
-                skel_file.seek(skel_name_offset)
-                bone_name = read_zero_term_string(skel_file)
-                skel_file.seek(skel_pos_offset + x * 0x30)
-                tmp_vec = struct.unpack('<fff', skel_file.read(4 * 3))
-                if self.use_yx_orientation:
-                    bone_vec = (tmp_vec[2], tmp_vec[0], tmp_vec[1])
-                else:
-                    bone_vec = (tmp_vec[0], tmp_vec[1], tmp_vec[2])
-                skel_file.seek(4, 1)
-                temp_rot = struct.unpack('<ffff', skel_file.read(4 * 4))
-                if self.use_yx_orientation:
-                    bone_rot = (temp_rot[3], temp_rot[2], temp_rot[0], temp_rot[1])
-                else:
-                    bone_rot = (temp_rot[3], temp_rot[0], temp_rot[1], temp_rot[2])
-
-                skel_table.append({"loc": bone_vec, "rot": bone_rot})
-
-                edit_bone = armature_obj.data.edit_bones.new(bone_name)
+            edit_bones = armature_obj.data.edit_bones
+            new_bones = []
+            for bone_name, rest_matrix, length in zip(skeleton.names, rest_matrices.tolist(), lengths.tolist()):
+                edit_bone = edit_bones.new(bone_name)
                 edit_bone.use_connect = False
                 edit_bone.use_inherit_rotation = True
 
@@ -178,59 +181,20 @@ class HedgehogSkeletonImport(bpy.types.Operator, ImportHelper):
                     edit_bone.inherit_scale = 'ALIGNED'
 
                 edit_bone.use_local_location = True
+                # Setting the matrix keeps the bone's current length
                 edit_bone.head = (0, 0, 0)
-                if self.use_yx_orientation:
-                    edit_bone.tail = (0.1, 0, 0)
-                    edit_bone.roll = -1.5707963705062866
-                else:
-                    edit_bone.tail = (0, 0.1, 0)
-                if bone_parent > -1:
-                    edit_bone.parent = armature_obj.data.edit_bones[bone_parent]
-            utils_set_mode('POSE')
-
-            for x in range(skel_parenting_count):
-                pbone = armature_obj.pose.bones[x]
-                pbone.rotation_mode = 'QUATERNION'
-                pbone.rotation_quaternion = skel_table[x]["rot"]
-                pbone.location = skel_table[x]["loc"]
-
-            bpy.ops.pose.armature_apply()
+                edit_bone.tail = (0, length, 0)
+                edit_bone.matrix = rest_matrix
+                new_bones.append(edit_bone)
 
-            # Set bone lengths
-            if self.get_bone_lengths:
-                utils_set_mode('EDIT')
-                for x in range(skel_parenting_count):
-                    edit_bone = armature_obj.data.edit_bones[x]
-                    child_bone = None
-
-                    # Find child with the most children as the bone to calculate length from
-                    for child_bone_test in edit_bone.children:
-                        test = 0
-                        count = len(child_bone_test.children_recursive)
-                        if child_bone_test == edit_bone.children[0] or test < count:
-                            test = count
-                            child_bone = child_bone_test
-
-                    if child_bone:
-                        length = (edit_bone.head - child_bone.head).length
-                    elif self.get_bone_lengths_end == "prevLength":
-                        length = edit_bone.parent.length
-                    elif self.get_bone_lengths_end == "customLength":
-                        length = self.get_bone_lengths_custom
-                    else:
-                        length = self.get_bone_lengths_min
-
-                    if length > self.get_bone_lengths_max:
-                        edit_bone.length = self.get_bone_lengths_max
-                    elif length < self.get_bone_lengths_min:
-                        edit_bone.length = self.get_bone_lengths_min
-                    else:
-                        edit_bone.length = length
+            for edit_bone, bone_parent in zip(new_bones, skeleton.parents.tolist()):
+                if bone_parent > -1:
+                    edit_bone.parent = new_bones[bone_parent]
 
             utils_set_mode('OBJECT')
 
-            skel_file.close()
-            del skel_file
+            for pbone in armature_obj.pose.bones:
+                pbone.rotation_mode = 'QUATERNION'
 
         return {'FINISHED'}
 
@@ -241,29 +205,54 @@ class HedgehogSkeletonImport(bpy.types.Operator, ImportHelper):
             icon='OUTLINER_OB_ARMATURE'
         )
 
-    def skel_check(self, file):
-        file.seek(0x40, 0)
-        magic = file.read(4)
-        version = int.from_bytes(file.read(4), byteorder='little')
-        const = int.from_bytes(file.read(4), byteorder='little')
-        if magic != b'KSXP':
-            self.report({'ERROR'}, f"{file.name}: Not a valid PXD skeleton file")
-            return False
-        if version != 512 or const != 104:
-            self.report({'ERROR'}, f"{file.name}: Wrong PXD version")
-            return False
-        file.seek(0, 0)
-        return True
-
-
-def read_zero_term_string(file):
-    temp_bytes = []
-    while True:
-        b = file.read(1)
-        if b is None or b[0] == 0:
-            return bytes(temp_bytes).decode('utf-8')
+
+# Parents listed before their children, plus each bone's children in index order
+def get_hierarchy_order(parents):
+    children = [[] for _ in range(len(parents))]
+    roots = []
+    for bone, parent in enumerate(parents.tolist()):
+        if parent > -1:
+            children[parent].append(bone)
         else:
-            temp_bytes.append(b[0])
+            roots.append(bone)
+
+    order = []
+    stack = roots[::-1]
+    while stack:
+        bone = stack.pop()
+        order.append(bone)
+        stack.extend(reversed(children[bone]))
+    return order, children
+
+
+# Each bone reaches towards the head of its child with the most descendants, clamped between min and max length.
+# End bones get end_length, or their parent's length with use_parent_length.
+def get_bone_lengths(parents, heads, min_length, max_length, end_length, use_parent_length):
+    order, children = get_hierarchy_order(parents)
+
+    # Subtree sizes in one pass from the leaves up
+    subtree_size = np.ones(len(parents), dtype=np.int64)
+    for bone in reversed(order):
+        parent = parents[bone]
+        if parent > -1:
+            subtree_size[parent] += subtree_size[bone]
+
+    target = np.full(len(parents), -1, dtype=np.int64)
+    for bone, bone_children in enumerate(children):
+        if bone_children:
+            target[bone] = max(bone_children, key=lambda child: subtree_size[child])
+
+    has_child = target > -1
+    lengths = np.full(len(parents), end_length, dtype=np.float64)
+    lengths[has_child] = np.linalg.norm(heads[target[has_child]] - heads[has_child], axis=-1)
+    lengths = np.clip(lengths, min_length, max_length)
+
+    if use_parent_length:
+        for bone in order:
+            parent = parents[bone]
+            if not has_child[bone] and parent > -1:
+                lengths[bone] = lengths[parent]
+    return lengths
 
 
 def utils_set_mode(mode):
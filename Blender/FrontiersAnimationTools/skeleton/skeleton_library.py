@@ -0,0 +1,113 @@
+"""
+Index of the PXD skeletons under a folder, kept in the folder itself
+Each entry records the bone count and a hash of the bone names and hierarchy, so animations and armatures can be
+matched to their skeleton without importing anything
+No bpy calls in here
+"""
+
+
+import hashlib
+import json
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from .skeleton_reader import read_skeleton_structure
+
+LIBRARY_NAME = "frontiers_skeleton_library.json"
+# Bump whenever entries change for the same file, old libraries are then rebuilt from scratch
+LIBRARY_VERSION = 1
+SKELETON_EXTENSION = ".skl.pxd"
+
+
+# Same names in the same order with the same parents, rest transforms are not included
+def hash_structure(names, parents):
+    digest = hashlib.sha256()
+    digest.update("\0".join(names).encode('utf-8'))
+    digest.update(np.asarray(parents, dtype='<i4').tobytes())
+    return digest.hexdigest()
+
+
+# Unreadable files are kept with an empty entry so they aren't read again until they change
+def scan_skeleton(filepath):
+    try:
+        names, parents = read_skeleton_structure(filepath)
+    except (OSError, ValueError):
+        return {"bone_count": None, "structure": None}
+    return {"bone_count": len(names), "structure": hash_structure(names, parents)}
+
+
+class SkeletonLibrary:
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, LIBRARY_NAME)
+        self.files = {}  # Path relative to the library folder: entry
+        try:
+            with open(self.path, "r", encoding='utf-8') as file:
+                library = json.load(file)
+            if library.get("version") == LIBRARY_VERSION:
+                self.files = library["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+        self.build_lookup()
+
+    def build_lookup(self):
+        self.by_bone_count = {}
+        self.by_structure = {}
+        for file_name, entry in sorted(self.files.items()):
+            if entry["structure"] is None:
+                continue
+            self.by_bone_count.setdefault(entry["bone_count"], []).append(file_name)
+            self.by_structure.setdefault(entry["structure"], []).append(file_name)
+
+    # Rescan skeletons that are new or were modified since the last refresh, returns (rescanned, removed) counts
+    def refresh(self):
+        found = {}
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.lower().endswith(SKELETON_EXTENSION):
+                    continue
+                filepath = os.path.join(root, name)
+                try:
+                    stat = os.stat(filepath)
+                except OSError:
+                    continue
+                found[os.path.relpath(filepath, self.directory)] = (stat.st_mtime_ns, stat.st_size)
+
+        removed = [file_name for file_name in self.files if file_name not in found]
+        for file_name in removed:
+            del self.files[file_name]
+
+        stale = []
+        for file_name, (mtime, size) in found.items():
+            entry = self.files.get(file_name)
+            if not entry or entry["mtime"] != mtime or entry["size"] != size:
+                stale.append(file_name)
+
+        # Only a few small reads per file, mostly waiting on the disk
+        with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+            paths = [os.path.join(self.directory, file_name) for file_name in stale]
+            for file_name, entry in zip(stale, executor.map(scan_skeleton, paths)):
+                entry["mtime"], entry["size"] = found[file_name]
+                self.files[file_name] = entry
+
+        self.build_lookup()
+        return len(stale), len(removed)
+
+    # Absolute paths of indexed skeletons with this many bones
+    def find_by_bone_count(self, bone_count):
+        return [os.path.join(self.directory, file_name) for file_name in self.by_bone_count.get(bone_count, ())]
+
+    # Absolute paths of indexed skeletons with exactly these bones
+    def find_by_structure(self, names, parents):
+        structure = hash_structure(names, parents)
+        return [os.path.join(self.directory, file_name) for file_name in self.by_structure.get(structure, ())]
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding='utf-8') as file:
+                json.dump({"version": LIBRARY_VERSION, "files": self.files}, file, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,116 @@
+"""
+Reads PXD skeleton files into plain arrays
+No bpy calls in here so skeleton files can be scanned without creating any armatures
+
+File layout, see bina.py for the container:
+0x00    BINA header
+0x10    DATA chunk header, offsets in the DATA chunk are relative to 0x40
+0x40    KSXP skeleton header, each table is an offset followed by its count and capacity
+        Parent indices, s16 per bone, -1 for roots
+        Name table, 0x10 per bone, the first 8 bytes are the offset of the bone's name
+        Transform table, 0x30 per bone: location xyz, 0, rotation xyzw, scale xyz, 0
+        Bone names, zero terminated
+        Offset table
+"""
+
+
+import struct
+import numpy as np
+from ..bina import DATA_OFFSET
+
+KSXP_HEADER = struct.Struct('<4siqqq8xqqq8xqqq8x')
+KSXP_VERSION = 512
+TRANSFORM_DTYPE = np.dtype([('loc', '<f4', 3), ('pad', '<f4'), ('rot', '<f4', 4), ('scale', '<f4', 3),
+                            ('pad_scale', '<f4')])
+
+
+# Everything the importer needs from a skeleton file, rot is xyzw as stored in the file
+class PXDSkeleton:
+    def __init__(self, names, parents, loc, rot, scale):
+        self.names = names
+        self.parents = parents
+        self.loc = loc
+        self.rot = rot
+        self.scale = scale
+
+    @property
+    def bone_count(self):
+        return len(self.names)
+
+
+# Raises ValueError with a message fit for the user if data isn't a skeleton this addon can read
+def check_skeleton(data):
+    if len(data) < DATA_OFFSET + KSXP_HEADER.size:
+        raise ValueError("Not a valid PXD skeleton file")
+    magic, version, parent_offset = struct.unpack_from('<4siq', data, DATA_OFFSET)
+    if magic != b'KSXP':
+        raise ValueError("Not a valid PXD skeleton file")
+    if version != KSXP_VERSION or parent_offset != KSXP_HEADER.size:
+        raise ValueError("Wrong PXD version")
+
+
+# Zero terminated names starting at each of name_starts in data
+def get_names(data, name_starts):
+    names = []
+    for name_start in name_starts.tolist():
+        name_end = data.find(b'\x00', name_start)
+        if name_start < 0 or name_end < 0:
+            raise ValueError("Skeleton file is truncated")
+        names.append(data[name_start:name_end].decode('utf-8'))
+    return names
+
+
+def parse_skeleton(data):
+    check_skeleton(data)
+    (magic, version,
+     parent_offset, bone_count, parent_capacity,
+     name_offset, name_count, name_capacity,
+     transform_offset, transform_count, transform_capacity) = KSXP_HEADER.unpack_from(data, DATA_OFFSET)
+
+    try:
+        parents = np.frombuffer(data, dtype='<i2', count=bone_count, offset=parent_offset + DATA_OFFSET)
+        name_entries = np.frombuffer(data, dtype='<u8', count=bone_count * 2, offset=name_offset + DATA_OFFSET)
+        transforms = np.frombuffer(data, dtype=TRANSFORM_DTYPE, count=bone_count,
+                                   offset=transform_offset + DATA_OFFSET)
+    except ValueError:
+        raise ValueError("Skeleton file is truncated") from None
+
+    names = get_names(data, name_entries[0::2] + DATA_OFFSET)
+    return PXDSkeleton(names,
+                       parents.astype(np.int32),
+                       transforms['loc'].copy(),
+                       transforms['rot'].copy(),
+                       transforms['scale'].copy(),
+                       )
+
+
+# Reads the whole file in one go, raises ValueError for files that aren't skeletons and OSError if unreadable
+def read_skeleton(filepath):
+    with open(filepath, "rb") as file:
+        data = file.read()
+    return parse_skeleton(data)
+
+
+# Bone names and parent indices only, reads the headers, parent table and string table but skips the transforms
+def read_skeleton_structure(filepath):
+    with open(filepath, "rb") as file:
+        header = file.read(DATA_OFFSET + KSXP_HEADER.size)
+        check_skeleton(header)
+        string_offset, string_size = struct.unpack_from('<ii', header, 0x18)
+        (magic, version,
+         parent_offset, bone_count, parent_capacity,
+         name_offset, name_count, name_capacity,
+         transform_offset, transform_count, transform_capacity) = KSXP_HEADER.unpack_from(header, DATA_OFFSET)
+
+        file.seek(parent_offset + DATA_OFFSET)
+        parents = file.read(bone_count * 2)
+        file.seek(name_offset + DATA_OFFSET)
+        name_entries = file.read(bone_count * 0x10)
+        file.seek(string_offset + DATA_OFFSET)
+        strings = file.read(string_size)
+
+    if len(parents) < bone_count * 2 or len(name_entries) < bone_count * 0x10:
+        raise ValueError("Skeleton file is truncated")
+    name_starts = np.frombuffer(name_entries, dtype='<u8')[0::2].astype(np.int64) - string_offset
+    names = get_names(strings, name_starts)
+    return names, np.frombuffer(parents, dtype='<i2').astype(np.int32)
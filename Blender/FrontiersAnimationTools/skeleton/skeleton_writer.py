@@ -0,0 +1,61 @@
+"""
+Assembles PXD skeleton files from plain arrays, the layout is described in skeleton_reader.py
+No bpy calls in here so headless tools can write PXDs too
+"""
+
+
+import numpy as np
+from ..bina import DATA_OFFSET, pack_bina_headers, encode_offset_table
+from .skeleton_reader import KSXP_HEADER, KSXP_VERSION, TRANSFORM_DTYPE
+
+
+def align(offset, alignment):
+    return offset + -offset % alignment
+
+
+# names[bone], parents[bone] (-1 for roots), loc[bone] xyz and rot[bone] xyzw relative to the parent bone.
+# Returns the file contents as a single bytearray.
+def build_skeleton(names, parents, loc, rot):
+    bone_count = len(names)
+    name_bytes = [name.encode('ascii') + b'\x00' for name in names]
+
+    # Table offsets relative to the KSXP header
+    parent_offset = KSXP_HEADER.size
+    name_offset = align(parent_offset + bone_count * 2, 0x8)
+    transform_offset = align(name_offset + bone_count * 0x10, 0x10)
+    string_offset = transform_offset + bone_count * TRANSFORM_DTYPE.itemsize
+    string_size = align(sum(len(name) for name in name_bytes), 4)
+    offset_table_offset = DATA_OFFSET + string_offset + string_size
+
+    name_entries = np.zeros((bone_count, 2), dtype='<u8')
+    if bone_count:
+        name_entries[1:, 0] = np.cumsum([len(name) for name in name_bytes[:-1]])
+    name_entries[:, 0] += string_offset
+
+    transforms = np.zeros(bone_count, dtype=TRANSFORM_DTYPE)
+    transforms['loc'] = loc
+    transforms['rot'] = rot
+    transforms['scale'] = 1.0
+
+    # Table offsets in the KSXP header, then every name offset
+    pointers = [DATA_OFFSET + 0x8, DATA_OFFSET + 0x28, DATA_OFFSET + 0x48]
+    pointers += range(DATA_OFFSET + name_offset, DATA_OFFSET + name_offset + bone_count * 0x10, 0x10)
+    offset_table = encode_offset_table(pointers)
+
+    data = bytearray(offset_table_offset + len(offset_table))
+    pack_bina_headers(data, DATA_OFFSET + string_offset, string_size, len(offset_table))
+    KSXP_HEADER.pack_into(data, DATA_OFFSET, b'KSXP', KSXP_VERSION,
+                          parent_offset, bone_count, bone_count,
+                          name_offset, bone_count, bone_count,
+                          transform_offset, bone_count, bone_count)
+
+    def put(offset, array):
+        data[DATA_OFFSET + offset:DATA_OFFSET + offset + array.nbytes] = array.tobytes()
+
+    put(parent_offset, np.asarray(parents, dtype='<i2'))
+    put(name_offset, name_entries)
+    put(transform_offset, transforms)
+    data[DATA_OFFSET + string_offset:DATA_OFFSET + string_offset + string_size] = \
+        b''.join(name_bytes).ljust(string_size, b'\x00')
+    data[offset_table_offset:] = offset_table
+    return data
@@ -2,7 +2,9 @@
 
 import bpy
 import math
+import os
 import mathutils
+from bpy.app.handlers import persistent
 from bpy.props import (BoolProperty,
                        FloatProperty,
                        IntProperty,
@@ -10,6 +12,9 @@ from bpy.props import (BoolProperty,
                        EnumProperty,
                        CollectionProperty
                        )
+from ..animation.anim_import import load_pending_action, get_rig_binding, get_import_cache
+from ..animation.anim_catalog import AnimCatalog
+from ..skeleton.skeleton_library import SkeletonLibrary
 
 
 class MakeFrontiersActionActive(bpy.types.Operator):
@@ -26,6 +31,13 @@ class MakeFrontiersActionActive(bpy.types.Operator):
 
         if self.anim_name:
             action = bpy.data.actions[self.anim_name]
+            if action.pxd_pending:
+                cache = get_import_cache(scene_active)
+                loaded = load_pending_action(self, arm_active, action, cache)
+                if cache:
+                    cache.evict()
+                if not loaded:
+                    return {'CANCELLED'}
             if not arm_active.animation_data:
                 arm_active.animation_data_create()
             arm_active.animation_data.action = action
@@ -104,6 +116,62 @@ class SetTransformModes(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class IndexFrontiersSkeletons(bpy.types.Operator):
+    bl_label = "Index Skeleton Library"
+    bl_idname = "skel_custom.index_skeleton_library"
+    bl_description = "Scans the skeleton library folder for .skl.pxd files so animation imports can suggest " \
+                     "matching skeletons. Only new or modified files are read again"
+
+    @classmethod
+    def poll(cls, context):
+        return bool(context.scene.frontiers_skeleton_library)
+
+    def execute(self, context):
+        directory = bpy.path.abspath(context.scene.frontiers_skeleton_library)
+        if not os.path.isdir(directory):
+            self.report({'ERROR'}, f"Skeleton library folder \"{directory}\" does not exist.")
+            return {'CANCELLED'}
+
+        library = SkeletonLibrary(directory)
+        num_scanned, num_removed = library.refresh()
+        library.save()
+        self.report({'INFO'}, f"Indexed {len(library.files)} skeletons ({num_scanned} scanned, {num_removed} removed).")
+
+        arm_active = context.active_object
+        if arm_active and arm_active.type == 'ARMATURE':
+            binding = get_rig_binding(arm_active)
+            matches = library.find_by_structure(binding.names, binding.parents)
+            if matches:
+                self.report({'INFO'}, f"\"{arm_active.name}\" matches: "
+                                      f"{', '.join(os.path.relpath(path, directory) for path in matches)}")
+        return {'FINISHED'}
+
+
+class CatalogFrontiersAnimations(bpy.types.Operator):
+    bl_label = "Catalog Animations"
+    bl_idname = "anim_custom.catalog_frontiers_animations"
+    bl_description = "Reads the headers of every .anm.pxd file in the catalog folder into a searchable SQLite " \
+                     "catalog. Only new or modified files are read again"
+
+    @classmethod
+    def poll(cls, context):
+        return bool(context.scene.frontiers_anim_catalog)
+
+    def execute(self, context):
+        directory = bpy.path.abspath(context.scene.frontiers_anim_catalog)
+        if not os.path.isdir(directory):
+            self.report({'ERROR'}, f"Animation catalog folder \"{directory}\" does not exist.")
+            return {'CANCELLED'}
+
+        with AnimCatalog(directory) as catalog:
+            num_scanned, num_removed = catalog.refresh()
+            num_additive = len(catalog.find(is_additive=True))
+            num_root = len(catalog.find(has_root=True))
+            self.report({'INFO'}, f"Cataloged {catalog.count()} animations, {num_additive} additive and {num_root} "
+                                  f"with root motion ({num_scanned} scanned, {num_removed} removed).")
+        return {'FINISHED'}
+
+
 def filter_actions(action_list, context):
     return [action for action in action_list if
             action.pxd_export and
@@ -111,4 +179,67 @@ def filter_actions(action_list, context):
             context.scene.frontiers_anim_contains in action.name]
 
 
-
+# The side panel redraws constantly, so the filtered view of bpy.data.actions is only rebuilt when an action is
+# added, removed, renamed or (un)marked for export, or when the filters change
+class ActionFilterCache:
+    def __init__(self):
+        self.generation = 0
+        self.key = None
+        self.flags = []  # UIList filter flags, one per action in bpy.data.actions order
+        self.num_shown = 0
+        self.num_export = 0
+        self.subscribed = False
+
+    def invalidate(self, *args):
+        self.generation += 1
+
+    # Subscriptions are dropped whenever a file is loaded, see invalidate_action_filter
+    def subscribe(self):
+        for prop in ("name", "pxd_export"):
+            bpy.msgbus.subscribe_rna(
+                key=(bpy.types.Action, prop),
+                owner=self,
+                args=(),
+                notify=self.invalidate,
+            )
+        self.subscribed = True
+
+    def unsubscribe(self):
+        bpy.msgbus.clear_by_owner(self)
+        self.subscribed = False
+
+    def update(self, context, bitflag):
+        if not self.subscribed:
+            self.subscribe()
+
+        actions = bpy.data.actions
+        prefix = context.scene.frontiers_anim_prefix
+        contains = context.scene.frontiers_anim_contains
+        # Adding or removing actions doesn't publish anything, the count and depsgraph updates catch that
+        key = (self.generation, len(actions), prefix, contains)
+        if key == self.key:
+            return
+
+        shown = [action.name.startswith(prefix) and contains in action.name for action in actions]
+        self.flags = [bitflag if is_shown else 0 for is_shown in shown]
+        self.num_shown = sum(shown)
+        self.num_export = sum(is_shown and action.pxd_export for action, is_shown in zip(actions, shown))
+        self.key = key
+
+
+action_filter_cache = ActionFilterCache()
+
+
+# Loading a file, undo and redo change actions without publishing to msgbus.
+# Resubscribing is harmless if the subscriptions survived.
+@persistent
+def invalidate_action_filter(*args):
+    action_filter_cache.unsubscribe()
+    action_filter_cache.invalidate()
+
+
+# Catches an action being removed and another added between redraws, which leaves the count unchanged
+@persistent
+def invalidate_action_filter_on_update(scene, depsgraph):
+    if depsgraph.id_type_updated('ACTION'):
+        action_filter_cache.invalidate()
@@ -11,7 +11,33 @@ from .func_ops import (MakeFrontiersActionActive,
                        ClearFrontiersFakeUser,
                        MakeFrontiersActionPersistent,
                        SetTransformModes,
-                       filter_actions)
+                       IndexFrontiersSkeletons,
+                       CatalogFrontiersAnimations,
+                       action_filter_cache,
+                       invalidate_action_filter,
+                       invalidate_action_filter_on_update)
+
+
+# Only the visible rows are drawn, so scrolling pages through large action lists without slowing the panel down
+class FRONTIERS_UL_actions(bpy.types.UIList):
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        row = layout.row(align=True)
+        row.prop(item, 'name', text="", emboss=False, icon='ACTION_TWEAK')
+        row.prop(item, 'pxd_export', text="")
+        ma = row.operator(
+            MakeFrontiersActionActive.bl_idname,
+            text="",
+            icon='CON_ACTION'
+        )
+        ma.anim_name = item.name
+
+    # Filtering is done with the prefix and contains fields above the list instead
+    def draw_filter(self, context, layout):
+        pass
+
+    def filter_items(self, context, data, propname):
+        action_filter_cache.update(context, self.bitflag_filter_item)
+        return action_filter_cache.flags, []
 
 
 class FrontiersAnimationPanel(bpy.types.Panel):
@@ -29,7 +55,8 @@ class FrontiersAnimationPanel(bpy.types.Panel):
 
         export_box = layout.box()
         export_box.label(text="Export Settings", icon='EXPORT')
-        export_box.label(text=f"Export {len(filter_actions(bpy.data.actions, context))} animations")
+        action_filter_cache.update(context, FRONTIERS_UL_actions.bitflag_filter_item)
+        export_box.label(text=f"Export {action_filter_cache.num_export} animations")
 
         export_box.operator(
             FrontiersAnimBatchExport.bl_idname,
@@ -37,6 +64,17 @@ class FrontiersAnimationPanel(bpy.types.Panel):
             icon='EXPORT',
         )
 
+        catalog_box = layout.box()
+        catalog_box.label(text="Animation Catalog", icon='FILE_FOLDER')
+
+        catalog_row = catalog_box.row()
+        catalog_row.prop(context.scene, 'frontiers_anim_catalog', text="Folder")
+        catalog_box.operator(
+            CatalogFrontiersAnimations.bl_idname,
+            text="Catalog Animations",
+            icon='FILE_REFRESH',
+        )
+
         skel_box = layout.box()
         skel_box.label(text="Skeleton Settings", icon='OUTLINER_OB_ARMATURE')
 
@@ -46,6 +84,14 @@ class FrontiersAnimationPanel(bpy.types.Panel):
             icon='BONE_DATA',
         )
 
+        library_row = skel_box.row()
+        library_row.prop(context.scene, 'frontiers_skeleton_library', text="Library")
+        skel_box.operator(
+            IndexFrontiersSkeletons.bl_idname,
+            text="Index Skeletons",
+            icon='FILE_REFRESH',
+        )
+
         action_box = layout.box()
         action_box.label(text="Action Settings", icon='ACTION')
 
@@ -73,38 +119,27 @@ class FrontiersAnimationPanel(bpy.types.Panel):
 
         action_list_box = action_box.box()
 
-        action_grid = action_list_box.grid_flow(row_major=True, columns=3, align=False)
-
-        action_grid.label(text="Action Name", icon='ACTION_TWEAK')
-        action_grid.label(icon='EXPORT')
-        act_col = action_grid.column()
-        act_col.label(icon='SCENE_DATA')
-
         if bpy.data.actions:
-            # Slows down with lots of actions. Seems like Blender in general just does that?
-            for action in bpy.data.actions:
-                if action.name.startswith(context.scene.frontiers_anim_prefix):
-                    if context.scene.frontiers_anim_contains in action.name:
-                        action_grid.prop(action, 'name', text="")
-                        action_grid.prop(action, 'pxd_export', text="")
-                        ma = action_grid.operator(
-                                    MakeFrontiersActionActive.bl_idname,
-                                    text="",
-                                    icon='CON_ACTION'
-                        )
-
-                        ma.anim_name = action.name
-
+            action_list_box.label(text=f"{action_filter_cache.num_shown} of {len(bpy.data.actions)} actions shown")
+            action_list_box.template_list(
+                "FRONTIERS_UL_actions", "",
+                bpy.data, "actions",
+                context.scene, "frontiers_action_index",
+                rows=10,
+            )
         else:
             action_list_box.label(text="No actions in scene...")
 
 
 def register():
+    bpy.utils.register_class(FRONTIERS_UL_actions)
     bpy.utils.register_class(FrontiersAnimationPanel)
     bpy.utils.register_class(MakeFrontiersActionActive)
     bpy.utils.register_class(ClearFrontiersFakeUser)
     bpy.utils.register_class(MakeFrontiersActionPersistent)
     bpy.utils.register_class(SetTransformModes)
+    bpy.utils.register_class(IndexFrontiersSkeletons)
+    bpy.utils.register_class(CatalogFrontiersAnimations)
 
     bpy.types.Scene.frontiers_anim_prefix = StringProperty(
         name="Action Prefix",
@@ -120,13 +155,65 @@ def register():
         options={'TEXTEDIT_UPDATE'}
     )
 
+    bpy.types.Scene.frontiers_skeleton_library = StringProperty(
+        name="Skeleton Library",
+        default="",
+        description="Folder searched for .skl.pxd files when looking for skeletons that match an animation or armature",
+        subtype='DIR_PATH',
+    )
+
+    bpy.types.Scene.frontiers_anim_catalog = StringProperty(
+        name="Animation Catalog",
+        default="",
+        description="Folder of .anm.pxd files to catalog",
+        subtype='DIR_PATH',
+    )
+
+    bpy.types.Scene.frontiers_action_index = IntProperty(
+        name="Active Action Index",
+        default=0,
+    )
+
+    # Set by the import operator, used when register-only actions are decoded
+    bpy.types.Scene.frontiers_use_import_cache = BoolProperty(
+        name="Use Import Cache",
+        default=True,
+        description="Cache register-only actions when they're decoded",
+    )
+
+    bpy.types.Scene.frontiers_import_cache_size = IntProperty(
+        name="Import Cache Size (MB)",
+        default=2048,
+        min=64,
+        description="Least recently used cache entries are removed once the cache grows past this size",
+    )
+
+    bpy.app.handlers.load_post.append(invalidate_action_filter)
+    bpy.app.handlers.undo_post.append(invalidate_action_filter)
+    bpy.app.handlers.redo_post.append(invalidate_action_filter)
+    bpy.app.handlers.depsgraph_update_post.append(invalidate_action_filter_on_update)
+
 
 def unregister():
+    bpy.utils.unregister_class(FRONTIERS_UL_actions)
     bpy.utils.unregister_class(FrontiersAnimationPanel)
     bpy.utils.unregister_class(MakeFrontiersActionActive)
     bpy.utils.unregister_class(ClearFrontiersFakeUser)
     bpy.utils.unregister_class(MakeFrontiersActionPersistent)
     bpy.utils.unregister_class(SetTransformModes)
+    bpy.utils.unregister_class(IndexFrontiersSkeletons)
+    bpy.utils.unregister_class(CatalogFrontiersAnimations)
 
     del bpy.types.Scene.frontiers_anim_prefix
     del bpy.types.Scene.frontiers_anim_contains
+    del bpy.types.Scene.frontiers_skeleton_library
+    del bpy.types.Scene.frontiers_anim_catalog
+    del bpy.types.Scene.frontiers_action_index
+    del bpy.types.Scene.frontiers_use_import_cache
+    del bpy.types.Scene.frontiers_import_cache_size
+
+    bpy.app.handlers.load_post.remove(invalidate_action_filter)
+    bpy.app.handlers.undo_post.remove(invalidate_action_filter)
+    bpy.app.handlers.redo_post.remove(invalidate_action_filter)
+    bpy.app.handlers.depsgraph_update_post.remove(invalidate_action_filter_on_update)
+    action_filter_cache.unsubscribe()
@@ -4,6 +4,10 @@
 #include <ostream>
 #include <iostream>
 #include <fstream>
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <cstdint>
 
 #include "acl/compression/compress.h"
 #include "acl/compression/compression_settings.h"
@@ -68,14 +72,52 @@ struct python_buffer
 	size_t data_buffer_size;
 };
 
-extern "C" __declspec(dllexport) python_buffer decompress(const char* buffer_in)
+// Time spent in each export since the last reset_timings call, summed over every thread.
+// The acl fields only cover the ACL calls, the rest of each total is spent converting buffers.
+struct native_timings
+{
+	uint64_t compress_calls;
+	uint64_t compress_ns;
+	uint64_t compress_acl_ns;
+	uint64_t decompress_calls;
+	uint64_t decompress_ns;
+	uint64_t decompress_acl_ns;
+};
+
+static std::atomic<uint64_t> compress_calls{ 0 };
+static std::atomic<uint64_t> compress_ns{ 0 };
+static std::atomic<uint64_t> compress_acl_ns{ 0 };
+static std::atomic<uint64_t> decompress_calls{ 0 };
+static std::atomic<uint64_t> decompress_ns{ 0 };
+static std::atomic<uint64_t> decompress_acl_ns{ 0 };
+
+// Adds the time from construction to destruction to total
+struct scoped_timer
+{
+	explicit scoped_timer(std::atomic<uint64_t>& total_) : total(total_), start(std::chrono::steady_clock::now()) {}
+
+	~scoped_timer()
+	{
+		const auto elapsed = std::chrono::steady_clock::now() - start;
+		total += static_cast<uint64_t>(std::chrono::duration_cast<std::chrono::nanoseconds>(elapsed).count());
+	}
+
+	std::atomic<uint64_t>& total;
+	std::chrono::steady_clock::time_point start;
+};
+
+// Decompresses frame_count samples starting at first_frame, clamped to the length of the animation
+python_buffer decompress_range(const char* buffer_in, uint32_t first_frame, uint32_t frame_count)
 {
+	scoped_timer timer(decompress_ns);
+	++decompress_calls;
+
 	decompression_context<default_transform_decompression_settings> context;
 	error_result result;
 
 	const compressed_tracks* compressed_anim = make_compressed_tracks(buffer_in, &result);
 
-	if (!context.initialize(*compressed_anim))
+	if (compressed_anim == nullptr || !context.initialize(*compressed_anim))
 	{
 		std::cout << "Failed to read animation file" << result.c_str() << std::endl;
 		python_buffer fail;
@@ -95,20 +137,26 @@ extern "C" __declspec(dllexport) python_buffer decompress(const char* buffer_in)
 
 	std::vector<std::vector<rtm::qvvf>> all_tracks;
 
-	for (uint32_t sample_index = 0; sample_index < compressed_anim->get_num_samples_per_track(); ++sample_index)
+	const uint32_t num_samples = compressed_anim->get_num_samples_per_track();
+	const uint32_t end_frame = first_frame < num_samples ? first_frame + std::min(frame_count, num_samples - first_frame) : first_frame;
+
 	{
-		const float sample_time = rtm::scalar_min(float(sample_index) / compressed_anim->get_sample_rate(), compressed_anim->get_duration());
+		scoped_timer acl_timer(decompress_acl_ns);
+		for (uint32_t sample_index = first_frame; sample_index < end_frame; ++sample_index)
+		{
+			const float sample_time = rtm::scalar_min(float(sample_index) / compressed_anim->get_sample_rate(), compressed_anim->get_duration());
 
-		context.seek(sample_time, acl::sample_rounding_policy::none);
-		context.decompress_tracks(writer);
-		all_tracks.push_back(writer.Transforms);
+			context.seek(sample_time, acl::sample_rounding_policy::none);
+			context.decompress_tracks(writer);
+			all_tracks.push_back(writer.Transforms);
+		}
 	}
 
 	anim_output output;
 
 	output.duration = compressed_anim->get_duration();
 	output.sample_rate = compressed_anim->get_sample_rate();
-	output.frame_count = compressed_anim->get_num_samples_per_track();
+	output.frame_count = static_cast<uint32_t>(all_tracks.size());
 	output.bone_count = compressed_anim->get_num_tracks();
 	output.all_tracks = all_tracks;
 
@@ -140,6 +188,43 @@ extern "C" __declspec(dllexport) python_buffer decompress(const char* buffer_in)
 	return python_out;
 }
 
+extern "C" __declspec(dllexport) python_buffer decompress(const char* buffer_in)
+{
+	return decompress_range(buffer_in, 0, UINT32_MAX);
+}
+
+// Same output layout as decompress, with frame_count set to the number of frames in the window
+extern "C" __declspec(dllexport) python_buffer decompress_window(const char* buffer_in, uint32_t first_frame, uint32_t frame_count)
+{
+	return decompress_range(buffer_in, first_frame, frame_count);
+}
+
+// Buffers returned by decompress/decompress_window/compress are owned by the caller once copied
+extern "C" __declspec(dllexport) void free_buffer(unsigned char* buffer)
+{
+	delete[] buffer;
+}
+
+extern "C" __declspec(dllexport) void get_timings(native_timings* timings_out)
+{
+	timings_out->compress_calls = compress_calls;
+	timings_out->compress_ns = compress_ns;
+	timings_out->compress_acl_ns = compress_acl_ns;
+	timings_out->decompress_calls = decompress_calls;
+	timings_out->decompress_ns = decompress_ns;
+	timings_out->decompress_acl_ns = decompress_acl_ns;
+}
+
+extern "C" __declspec(dllexport) void reset_timings()
+{
+	compress_calls = 0;
+	compress_ns = 0;
+	compress_acl_ns = 0;
+	decompress_calls = 0;
+	decompress_ns = 0;
+	decompress_acl_ns = 0;
+}
+
 #pragma optimize("", off) 
 track_array_qvvf load_tracks(const char*& buffer, ansi_allocator& allocator, uint32_t sample_count, float sample_rate, uint32_t track_count)
 {
@@ -171,6 +256,9 @@ track_array_qvvf load_tracks(const char*& buffer, ansi_allocator& allocator, uin
 #pragma optimize("", on) 
 extern "C" __declspec(dllexport) python_buffer compress(const char* buffer_in)
 {
+	scoped_timer timer(compress_ns);
+	++compress_calls;
+
 	ansi_allocator allocator;
 
 	float duration = *(float*)&buffer_in[0];
@@ -194,7 +282,11 @@ extern "C" __declspec(dllexport) python_buffer compress(const char* buffer_in)
 	compressed_tracks* out_compressed_tracks = nullptr;
 	compressed_tracks* root_out_compressed_tracks = nullptr;
 
-	error_result result = compress_track_list(allocator, raw_track_list, settings, out_compressed_tracks, stats);
+	error_result result;
+	{
+		scoped_timer acl_timer(compress_acl_ns);
+		result = compress_track_list(allocator, raw_track_list, settings, out_compressed_tracks, stats);
+	}
 	if (out_compressed_tracks == nullptr)
 	{
 		std::cout << "Failed to compress anim: " << result.c_str() << std::endl;